@@ -0,0 +1,209 @@
+"""Downloads album art once, pre-scales it for small displays and keeps every rendition on disk.\n
+Scaling needs Pillow (pip install Pillow). Without it only the "original" format is available."""
+import hashlib
+import importlib.util
+import io
+import os
+import threading
+
+FORMATS = ("original", "jpeg", "png", "rgb888", "rgb565", "rgb565le")
+
+CONTENT_TYPES = {"original": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png"} # Raw pixel formats are application/octet-stream
+
+PILLOW_MISSING = 'Pillow is required to scale album art (pip install Pillow), only the "original" format is available without it'
+
+# Name: (width, height, format)
+DEFAULT_RENDITIONS = {
+    "original": (0, 0, "original"),
+    "thumb": (64, 64, "rgb565"),
+    "lcd": (240, 240, "rgb565")
+}
+
+def rgb565(pixels, littleEndian=False) -> bytes:
+    """Packs RGB888 pixel bytes into RGB565, 2 bytes per pixel, big endian as SPI displays such as the ST7789 and ILI9341 expect."""
+    out = bytearray(len(pixels) // 3 * 2)
+    high, low = (1, 0) if littleEndian else (0, 1)
+    j = 0
+    for i in range(0, len(pixels) - 2, 3):
+        value = ((pixels[i] & 0xF8) << 8) | ((pixels[i + 1] & 0xFC) << 3) | (pixels[i + 2] >> 3)
+        out[j + high] = value >> 8
+        out[j + low] = value & 0xFF
+        j += 2
+    return bytes(out)
+
+def render(original, width, height, format) -> bytes:
+    """Scales an image (cropped to fill width x height) and encodes it in one of FORMATS."""
+    if format == "original":
+        return original
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format}, expected one of {FORMATS}")
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise ImportError(PILLOW_MISSING) from None
+
+    with Image.open(io.BytesIO(original)) as image:
+        image = ImageOps.fit(image.convert("RGB"), (width, height), Image.LANCZOS)
+    if format in ("jpeg", "png"):
+        output = io.BytesIO()
+        image.save(output, format.upper(), **({"quality": 85} if format == "jpeg" else {}))
+        return output.getvalue()
+    pixels = image.tobytes()
+    if format == "rgb888":
+        return pixels
+    return rgb565(pixels, littleEndian=format == "rgb565le")
+
+class ArtCache:
+    def __init__(self, folder, renditions=None, maxBytes=64 * 1024 * 1024, session=None) -> None:
+        """folder -> Directory the images are kept in, created if missing\n
+        renditions -> Dictionary of name to (width, height, format), defaults to DEFAULT_RENDITIONS. format is one of FORMATS\n
+        maxBytes -> Least recently used files are evicted once the folder holds more than this\n
+        session -> HTTPSession the images are downloaded with, created if not given"""
+        self.folder = folder
+        self.renditions = dict(renditions if renditions is not None else DEFAULT_RENDITIONS)
+        for name, (width, height, format) in self.renditions.items():
+            if format not in FORMATS:
+                raise ValueError(f"Unknown format {format} for rendition {name}, expected one of {FORMATS}")
+        if any(format != "original" for width, height, format in self.renditions.values()) and importlib.util.find_spec("PIL") is None:
+            raise ImportError(PILLOW_MISSING)
+        self.maxBytes = maxBytes
+        if session is None:
+            from HTTPSession import HTTPSession
+            session = HTTPSession(poolSize=4)
+        self.session = session
+        self.hits = 0
+        self.misses = 0
+        self.downloads = 0
+
+        self.__lock = threading.Lock()
+        self.__pending = {} # Path: lock held while that file is created, so concurrent requests download and scale it once
+        os.makedirs(folder, exist_ok=True)
+        self.__size = sum(os.path.getsize(path) for path in self.__files())
+
+    def __files(self) -> list:
+        return [os.path.join(self.folder, name) for name in os.listdir(self.folder) if name.endswith(".art")]
+
+    def key(self, url) -> str:
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def __rendition(self, rendition) -> tuple:
+        """(width, height, format) of a rendition, the downloaded image itself being available as "original" even when not configured."""
+        if rendition == "original" and rendition not in self.renditions:
+            return (0, 0, "original")
+        return self.renditions[rendition]
+
+    def path(self, url, rendition="original") -> str:
+        width, height, format = self.__rendition(rendition)
+        if format == "original":
+            return os.path.join(self.folder, f"{self.key(url)}.art")
+        return os.path.join(self.folder, f"{self.key(url)}-{width}x{height}-{format}.art")
+
+    def etag(self, url, rendition="original") -> str:
+        return f'"{self.key(url)}-{rendition}"'
+
+    def contentType(self, rendition) -> str:
+        return CONTENT_TYPES.get(self.__rendition(rendition)[2], "application/octet-stream")
+
+    def get(self, url, rendition="original") -> bytes:
+        """Returns the image at url in a rendition, downloading and scaling it only if it is not on disk yet.\n
+        Returns None if the image could not be downloaded. Raises KeyError for unknown renditions."""
+        path = self.path(url, rendition)
+        data = self.__read(path)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+
+        width, height, format = self.__rendition(rendition)
+        original = lambda: self.__once(self.path(url), lambda: self.__download(url))
+        if format == "original":
+            return original()
+        return self.__once(path, lambda: self.__scale(original(), width, height, format))
+
+    def prefetch(self, url) -> None:
+        """Downloads an image and renders every rendition, e.g. as soon as a new track starts playing."""
+        for rendition in self.renditions:
+            self.get(url, rendition)
+
+    def __scale(self, original, width, height, format) -> bytes:
+        if original is None:
+            return None
+        return render(original, width, height, format)
+
+    def __once(self, path, produce) -> bytes:
+        """Returns the file at path, calling produce() to create it if missing. Threads asking for the same file wait for the first."""
+        with self.__lock:
+            pending = self.__pending.setdefault(path, threading.Lock())
+        with pending:
+            data = self.__read(path) # Written by another thread while this one waited
+            if data is None:
+                data = produce()
+                if data is not None:
+                    self.__write(path, data)
+        with self.__lock:
+            self.__pending.pop(path, None)
+        return data
+
+    def __download(self, url) -> bytes:
+        response = self.session.get(url)
+        if response.status_code != 200:
+            return None
+        self.downloads += 1
+        return response.content
+
+    def __read(self, path) -> bytes:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def __write(self, path, data) -> None:
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        with self.__lock:
+            try:
+                self.__size -= os.path.getsize(path)
+            except OSError:
+                pass
+            os.replace(temp, path)
+            self.__size += len(data)
+            if self.__size > self.maxBytes:
+                self.__evict(path)
+
+    def __evict(self, keep) -> None:
+        """Removes the least recently used files until the folder is back to 90% of maxBytes, sparing the file just written."""
+        files = sorted(self.__files(), key=lambda path: os.stat(path).st_mtime)
+        self.__size = sum(os.path.getsize(path) for path in files)
+        for path in files:
+            if self.__size <= self.maxBytes * 0.9:
+                break
+            if path == keep:
+                continue
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self.__size -= size
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self.__lock:
+            for path in self.__files():
+                os.remove(path)
+            self.__size = 0
+
+    @property
+    def size(self) -> int:
+        """Bytes held on disk."""
+        return self.__size
+
+    def stats(self) -> dict:
+        """Hit, miss and download counters."""
+        return {"hits": self.hits, "misses": self.misses, "downloads": self.downloads, "bytes": self.__size}
+
+    def __len__(self) -> int:
+        return len(self.__files())
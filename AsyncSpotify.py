@@ -0,0 +1,345 @@
+"""asyncio Spotify object, exposing the same requests as Spotify as coroutines over a shared connection pool."""
+import json
+import time
+
+
+# Other Programs
+from SpotifyCore import (
+    authorizeUrl, tokenUrl, playbackUrl, searchUrl, addToQueueUrl, queueUrl, skipUrl, playlistUrl, playlistItemsUrl, playlistImageUrl,
+    authorizationCodeForm, refreshTokenForm, tokenRequest, tokenResult, responseResult, cacheLookup, cacheResult, contextUrl, needsPlaylistArt, setPlaylistArt,
+    playlistTracks, PLAYLIST_TRACK_FIELDS, firstTrackURI, queueURIs, batchResults, batchStatus
+)
+from CredentialStore import CredentialFile
+from TokenManager import AsyncTokenManager
+from ResponseCache import ResponseCache
+from Metrics import NullMetrics, endpointName
+from RequestScheduler import AsyncRequestScheduler, PRIORITY_USER, PRIORITY_DEFAULT, PRIORITY_BACKGROUND, IDEMPOTENT_METHODS
+from TrackSnapshot import TrackSnapshot, extractSnapshot
+
+def createClient(poolSize=100, keepAlive=True, timeout=(3.05, 10), http2=False) -> "httpx.AsyncClient":
+    """Creates an async connection pool which can be shared by any number of AsyncSpotify objects.\n
+    http2 requires httpx to be installed with the http2 extra."""
+    import httpx
+    try:
+        import h2 # noqa: F401
+    except ImportError:
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(max_connections=poolSize, max_keepalive_connections=poolSize if keepAlive else 0),
+        timeout=httpx.Timeout(timeout[1], connect=timeout[0])
+    )
+
+class AsyncSpotify:
+    def __init__(self, BASE_64_STRING, CLIENT_ID, REDIRECT_URI, SCOPES, JSON_FILE_FOLDER="", API_URL="https://api.spotify.com", ACCOUNTS_URL="https://accounts.spotify.com", client=None, REFRESH_TOKEN=None, cache=None, scheduler=None, onRefreshToken=None, metrics=None) -> None:
+        """BASE_64_STRING - Base 64 String of --> clientid:clientsecret\n
+        CLIENT_ID - Users client ID from --> https://developer.spotify.com/dashboard\n
+        REDIRECT_URI - Found on Spotify Developer Dashboard\n
+        SCOPES -> Required scopes for the application to function\n
+        JSON_FILE_FOLDER -> Possible subfolder for JSON file\n
+        API_URL, ACCOUNTS_URL -> Base URLs of the Spotify Web API and Accounts service\n
+        client -> httpx.AsyncClient from createClient(), shared between accounts. One is created on the first request if not given\n
+        REFRESH_TOKEN -> Refresh token of the account, read from the Credentials file if not given\n
+        cache -> ResponseCache for read endpoints, an in-memory cache is created if not given, False disables caching. Accounts sharing one should each be given cache.namespaced(account)\n
+        scheduler -> AsyncRequestScheduler throttling and retrying every API request, may be shared between accounts\n
+        onRefreshToken -> Called with every new refresh token the API issues, e.g. to persist it\n
+        metrics -> Receives a record of every request, cache lookup and token refresh (see Metrics), may be shared between accounts\n
+        The access token is fetched on the first request, not at construction."""
+        self.BASE_64_STRING = BASE_64_STRING
+        self.CLIENT_ID = CLIENT_ID
+        self.REDIRECT_URI = REDIRECT_URI
+        self.JSON_FILE_FOLDER = JSON_FILE_FOLDER
+        self.SCOPES = SCOPES
+        self.API_URL = API_URL
+        self.ACCOUNTS_URL = ACCOUNTS_URL
+        self.client = client
+        self.cache = ResponseCache() if cache is None else cache or None
+        self.scheduler = scheduler if scheduler is not None else AsyncRequestScheduler()
+        self.onRefreshToken = onRefreshToken
+        self.metrics = metrics if metrics is not None else NullMetrics()
+
+        self.credentials = None # CredentialFile, when the refresh token is kept in the Credentials file
+
+        self.tokens = AsyncTokenManager(self.__refreshAccessToken)
+        if REFRESH_TOKEN is not None:
+            self.refreshToken = REFRESH_TOKEN
+        else:
+            self.credentials = CredentialFile(f"{JSON_FILE_FOLDER}credentials.json")
+            try:
+                self.refreshToken = self.__retrieveCredFile()["REFRESHKEY"]
+            except KeyError:
+                self.refreshToken = ""
+
+    @property
+    def accessToken(self) -> str:
+        """The current access token, as held by the token manager."""
+        return self.tokens.accessToken
+
+    def getKeyUrl(self) -> str:
+        """Returns a URL which the user must go to to get their initial Authorization Token.\n
+        Code is stated after ?code="""
+        return authorizeUrl(self.ACCOUNTS_URL, self.CLIENT_ID, self.SCOPES, self.REDIRECT_URI)
+
+    async def authorize(self, token) -> None:
+        """Gets initial refresh and access token, using the intial authorization token, and saves the refresh token."""
+        response = await self.__tokenRequest(authorizationCodeForm(token, self.REDIRECT_URI))
+        accessToken, expiresIn, refreshToken = tokenResult(response)
+        if accessToken is None or refreshToken is None:
+            print(response)
+            return
+        self.__setRefreshToken(refreshToken)
+        self.tokens.set(accessToken, expiresIn)
+        if self.credentials is None:
+            self.credentials = CredentialFile(f"{self.JSON_FILE_FOLDER}credentials.json")
+        self.__saveCredFile({"REFRESHKEY": self.refreshToken})
+
+    def __connect(self):
+        """Creates the connection pool on the first request, so that importing and constructing an AsyncSpotify object does not import httpx."""
+        if self.client is None:
+            self.client = createClient()
+        return self.client
+
+    async def __tokenRequest(self, form) -> dict:
+        """Posts a form to the token endpoint, authenticating with the client secret."""
+        headers, body = tokenRequest(form, self.BASE_64_STRING)
+        return (await self.__connect().post(tokenUrl(self.ACCOUNTS_URL), headers=headers, content=body)).json()
+
+    def __setRefreshToken(self, refreshToken) -> None:
+        if refreshToken != self.refreshToken:
+            self.refreshToken = refreshToken
+            if self.onRefreshToken is not None:
+                self.onRefreshToken(refreshToken)
+            elif self.credentials is not None: # Rotated tokens are persisted, the old one may already be revoked
+                self.credentials.update(lambda data: {**data, "REFRESHKEY": refreshToken})
+
+    async def __refreshAccessToken(self) -> tuple:
+        """Refreshes the Access token using the Refresh Token, returns (accessToken, expiresIn) or None on failure."""
+        if self.refreshToken == "": # Not authorized yet
+            return None
+        accessToken, expiresIn, refreshToken = tokenResult(await self.__tokenRequest(refreshTokenForm(self.refreshToken)))
+        if refreshToken is not None: # The API does not always respond with a refresh token
+            self.__setRefreshToken(refreshToken)
+
+        result = None
+        if accessToken is not None:
+            result = accessToken, expiresIn
+        else:
+            print("InvalidRefreshToken", self.refreshToken)
+        self.metrics.tokenRefresh(result is not None)
+        return result
+
+    async def __send(self, method, url, data="", headers=None, priority=PRIORITY_DEFAULT):
+        """Sends an HTTP request with a valid access token, refreshing and retrying once on 401, and returns the response."""
+        headers = dict(headers or {})
+        token = await self.tokens.get()
+        headers["Authorization"] = f"Bearer {token}"
+        attempts = [0]
+
+        def send():
+            attempts[0] += 1
+            return self.__connect().request(method, url, headers=headers, content=data or None)
+
+        start = time.perf_counter() if self.metrics.enabled else 0.0
+        response = await self.scheduler.execute(send, priority, method in IDEMPOTENT_METHODS)
+        if response.status_code == 401:
+            token = await self.tokens.refresh(token)
+            headers["Authorization"] = f"Bearer {token}"
+            response = await self.scheduler.execute(send, priority, method in IDEMPOTENT_METHODS)
+        if self.metrics.enabled:
+            self.metrics.request(method, endpointName(url), response.status_code, time.perf_counter() - start, len(data or ""), len(response.content), attempts[0] - 1)
+        return response
+
+    async def __request(self, method, url, data="", priority=PRIORITY_DEFAULT) -> dict:
+        response = await self.__send(method, url, data, priority=priority)
+        return responseResult(response.status_code, response.content)
+
+    async def get(self, url, priority=PRIORITY_DEFAULT, revalidate=False) -> dict:
+        """Handles token expiry and no content automatically when making an HTTP GET request.\n
+        Read endpoints are answered from the cache while fresh, and revalidated with their ETag once stale.\n
+        revalidate -> Ask the API even if the cached response is fresh, for reads which must see the latest state"""
+        if self.cache is None or self.cache.ttlFor(url) is None:
+            return await self.__request("GET", url, priority=priority)
+
+        result, entry, headers = cacheLookup(self.cache, self.metrics, url, revalidate)
+        if result is not None:
+            return result
+        response = await self.__send("GET", url, headers=headers, priority=priority)
+        return cacheResult(self.cache, self.metrics, url, entry, response.status_code, response.content, response.headers.get("ETag"))
+
+    async def post(self, url, data="", priority=PRIORITY_DEFAULT) -> dict:
+        """Handles token expiry and no content automatically when making an HTTP POST request."""
+        return await self.__request("POST", url, data, priority)
+
+    async def requestPlayback(self) -> json:
+        """Returns the users currently playing song as a json object."""
+        return await self.get(playbackUrl(self.API_URL), PRIORITY_BACKGROUND)
+
+    async def requestPlaybackSnapshot(self) -> TrackSnapshot:
+        """Retrieves the users currently playing song as a TrackSnapshot, falling back to the playlist image when the track has no album art."""
+        data, statusCode = await self.requestPlayback()
+
+        # If there is no content, there is nothing to format!
+        if statusCode == 204:
+            return data, statusCode
+
+        snapshot = extractSnapshot(data)
+        playlist = needsPlaylistArt(snapshot, contextUrl(data))
+        if playlist is not None:
+            setPlaylistArt(snapshot, (await self.getPlaylistImage(playlist))[0])
+
+        return snapshot, statusCode
+
+    async def requestFormattedPlayback(self) -> dict:
+        """Retrieves the users currently playing song, formats it into the necessary data and outputs it as a dictionary."""
+        snapshot, statusCode = await self.requestPlaybackSnapshot()
+        if statusCode == 204:
+            return snapshot, statusCode
+        return snapshot.asDict(), statusCode
+
+    def __retrieveCredFile(self) -> dict:
+        """Retrieves refresh token from Credentials file."""
+        return self.credentials.read()
+
+    def __saveCredFile(self, data) -> None:
+        """Saves refresh token to the Credentials file, atomically and at once."""
+        self.credentials.update(lambda current: {**current, **data})
+        self.credentials.flush()
+
+    async def search(self, query, searchType, limit=None) -> dict:
+        """Searches for a song on the Spoify Database\n
+        Common valid search types include:
+        * "track"
+        * "album"
+        * "artist"\n
+        limit -> Maximum number of results, the API defaults to 20"""
+        return await self.get(searchUrl(self.API_URL, query, searchType, limit))
+
+    async def searchAndQueue(self, query) -> json:
+        """Searches and Queues a song on the users spotify account."""
+        response, statusCode = await self.search(query, "track", limit=1)
+        newTrack = response["tracks"]["items"][0]["uri"]
+        return await self.addToQueue(newTrack)
+
+    async def addToQueue(self, uri) -> json:
+        """Adds a track to queue, using the tracks unique identifier."""
+        return await self.post(addToQueueUrl(self.API_URL, uri), priority=PRIORITY_USER)
+
+    async def getQueue(self) -> dict:
+        """Gets the currently playing track and the tracks in the users queue."""
+        return await self.get(queueUrl(self.API_URL))
+
+    async def queueBatch(self, items, concurrency=8, dedupe=True) -> list:
+        """Queues many tracks, given as URIs (spotify:track:...) and/or search queries, in the given order.\n
+        Searches run concurrently (at most concurrency at once), then tracks are added to the queue one by one.\n
+        dedupe -> Skip tracks already playing, already in the queue or earlier in items\n
+        Returns one dictionary per item: {"item", "uri", "status", "statusCode"}, status being "queued", "duplicate", "not_found" or "failed"."""
+        import asyncio
+        results = batchResults(items)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def resolve(result):
+            async with semaphore:
+                response, result["statusCode"] = await self.search(result["item"], "track", limit=1)
+            result["uri"] = firstTrackURI(response)
+
+        searches = [resolve(result) for result in results if result["uri"] is None]
+        queue = set()
+        if dedupe:
+            current, *searched = await asyncio.gather(self.getQueue(), *searches)
+            queue = queueURIs(current[0])
+        else:
+            await asyncio.gather(*searches)
+
+        for result in results:
+            if not batchStatus(result, queue, dedupe):
+                continue
+            response, result["statusCode"] = await self.addToQueue(result["uri"])
+            result["status"] = "queued" if result["statusCode"] in (200, 204) else "failed"
+            queue.add(result["uri"])
+        return results
+
+    async def skip(self, forward=True) -> json:
+        """Skips the currently playing song in the users queue."""
+        return await self.post(skipUrl(self.API_URL, forward), priority=PRIORITY_USER)
+
+    async def getPlaylist(self, playlistID, fields=None, revalidate=False) -> dict:
+        """Gets a playlists details, e.g. fields="snapshot_id,name" to only check whether it changed (with revalidate, see get)."""
+        return await self.get(playlistUrl(self.API_URL, playlistID, fields), revalidate=revalidate)
+
+    async def getPlaylistItems(self, playlistID) -> dict:
+        """Gets the first page (up to 100 items) of a users playlist, use iterPlaylistItems for the whole contents."""
+        return await self.get(playlistItemsUrl(self.API_URL, playlistID))
+
+    async def iterPlaylistItems(self, playlistID, fields=PLAYLIST_TRACK_FIELDS, limit=100, prefetch=0, skipMissing=True):
+        """Lazily yields every track of a playlist as PlaylistTrack records, one page at a time.\n
+        fields -> Projection sent to the API to shrink each page, must keep next, total and the track fields used by PlaylistTrack\n
+        limit -> Items per page (maximum 100)\n
+        prefetch -> Number of pages fetched concurrently ahead of the one being consumed, 0 follows next links sequentially\n
+        skipMissing -> False yields items without a track as records whose fields are all None, see playlistTracks\n
+        Pages are not cached, so memory use stays bounded however long the playlist is."""
+        url = f"{playlistItemsUrl(self.API_URL, playlistID)}?fields={fields}&limit={limit}"
+        page, statusCode = await self.__request("GET", f"{url}&offset=0")
+        if statusCode != 200:
+            return
+
+        if prefetch <= 0:
+            position = 0
+            while True:
+                tracks = playlistTracks(page, position, skipMissing)
+                position += len(page.get("items", []))
+                nextUrl = page.get("next")
+                page = None
+                for track in tracks:
+                    yield track
+                if not nextUrl:
+                    return
+                page, statusCode = await self.__request("GET", nextUrl)
+                if statusCode != 200:
+                    return
+
+        import asyncio
+        offsets = iter(range(limit, page.get("total", 0), limit))
+        pending = []
+        try:
+            for offset in offsets:
+                pending.append((offset, asyncio.ensure_future(self.__request("GET", f"{url}&offset={offset}"))))
+                if len(pending) >= prefetch:
+                    break
+            tracks = playlistTracks(page, 0, skipMissing)
+            page = None
+            for track in tracks:
+                yield track
+
+            while pending:
+                offset, task = pending.pop(0)
+                for nextOffset in offsets:
+                    pending.append((nextOffset, asyncio.ensure_future(self.__request("GET", f"{url}&offset={nextOffset}"))))
+                    break
+                page, statusCode = await task
+                if statusCode != 200:
+                    return
+                tracks = playlistTracks(page, offset, skipMissing)
+                page = None
+                for track in tracks:
+                    yield track
+        finally:
+            for offset, task in pending:
+                task.cancel()
+
+    async def getPlaylistImage(self, playlistID) -> str:
+        """Gets the image of the currently playing playlist"""
+        return await self.get(playlistImageUrl(self.API_URL, playlistID))
+
+async def pollAccounts(accounts, concurrency=100, formatted=True) -> list:
+    """Polls the playback of many AsyncSpotify accounts at once, with at most concurrency requests in flight.\n
+    Returns a list in the same order as accounts, holding (data, statusCode) or the exception raised for that account."""
+    import asyncio
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def poll(account):
+        async with semaphore:
+            if formatted:
+                return await account.requestFormattedPlayback()
+            return await account.requestPlayback()
+
+    return await asyncio.gather(*(poll(account) for account in accounts), return_exceptions=True)
@@ -0,0 +1,14 @@
+"""Authorization code flow helpers: PKCE and the error raised when authorization fails.\n
+The authorize URL is built by SpotifyCore.authorizeUrl and the ?code= redirect captured by CallbackServer."""
+import base64
+import hashlib
+import secrets
+
+def pkcePair() -> tuple:
+    """Returns a new (codeVerifier, codeChallenge) for the PKCE flow, the challenge being the S256 hash of the verifier."""
+    verifier = secrets.token_urlsafe(64)
+    challenge = base64.urlsafe_b64encode(hashlib.sha256(verifier.encode()).digest()).rstrip(b"=").decode()
+    return verifier, challenge
+
+class AuthorizationError(Exception):
+    """Raised when the user denies access or the redirect does not match the request."""
@@ -0,0 +1,84 @@
+"""Loopback server capturing the ?code= redirect of the authorization code flow, kept apart from Authorization as http.server is slow to import."""
+import html
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# Other Programs
+from Authorization import AuthorizationError
+
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path != self.server.callbackPath:
+            self.send_error(404)
+            return
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if self.server.state is not None and query.get("state") != self.server.state:
+            self.respond(400, "Authorization failed: the state does not match, please retry from the start.")
+            return
+        if "code" in query:
+            self.respond(200, "Authorization complete, you can close this window.")
+            self.server.finish(query["code"], None)
+        else:
+            self.respond(400, f"Authorization failed: {query.get('error', 'no code received')}.")
+            self.server.finish(None, AuthorizationError(query.get("error", "no code received")))
+
+    def respond(self, status, message) -> None:
+        body = f"<!doctype html><title>Spotify</title><p>{html.escape(message)}</p>".encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+class CallbackServer:
+    def __init__(self, REDIRECT_URI, state=None) -> None:
+        """Serves the redirect URI on the loopback interface until the authorization code arrives.\n
+        REDIRECT_URI -> Must be a loopback URL with a port, e.g. http://127.0.0.1:8888/callback\n
+        state -> Value sent in the authorize URL, redirects carrying any other state are rejected"""
+        url = urlsplit(REDIRECT_URI)
+        if url.scheme != "http" or url.hostname not in LOOPBACK_HOSTS:
+            raise ValueError(f"{REDIRECT_URI} is not a loopback http:// redirect URI")
+        self.REDIRECT_URI = REDIRECT_URI
+        self.code = None
+        self.error = None
+        self.__received = threading.Event()
+        serverClass = ThreadingHTTPServer
+        if ":" in url.hostname: # [::1]
+            serverClass = type("ThreadingHTTPServer6", (ThreadingHTTPServer,), {"address_family": socket.AF_INET6})
+        self.__server = serverClass((url.hostname, url.port or 80), CallbackHandler)
+        self.__server.callbackPath = url.path or "/"
+        self.__server.state = state
+        self.__server.finish = self.__finish
+        self.__thread = None
+
+    def __finish(self, code, error) -> None:
+        if not self.__received.is_set():
+            self.code, self.error = code, error
+            self.__received.set()
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def wait(self, timeout=None) -> str:
+        """Returns the authorization code once the redirect arrives, None on timeout. Raises AuthorizationError if access was denied."""
+        if not self.__received.wait(timeout):
+            return None
+        if self.error is not None:
+            raise self.error
+        return self.code
+
+    def stop(self) -> None:
+        if self.__thread is not None:
+            self.__server.shutdown()
+            self.__thread = None
+        self.__server.server_close()
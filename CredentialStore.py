@@ -0,0 +1,217 @@
+import atexit
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+# Account name given to a single-account credentials.json ({"REFRESHKEY": ...}) as written by Spotify
+DEFAULT_ACCOUNT = "default"
+
+class MemoryCredentialStore:
+    def __init__(self, tokens=None) -> None:
+        """In-memory backend, and the interface a custom credential store must implement: load, save and delete.\n
+        tokens -> Initial {account: refreshToken} dictionary"""
+        self.__tokens = dict(tokens or {})
+        self.__lock = threading.Lock()
+
+    def load(self) -> dict:
+        """Returns {account: refreshToken} for every stored account."""
+        with self.__lock:
+            return dict(self.__tokens)
+
+    def save(self, account, refreshToken) -> None:
+        """Stores the refresh token of an account, replacing any previous one."""
+        with self.__lock:
+            self.__tokens[account] = refreshToken
+
+    def delete(self, account) -> None:
+        with self.__lock:
+            self.__tokens.pop(account, None)
+
+def atomicWrite(path, data) -> None:
+    """Writes data as JSON so that readers see either the old or the new file, never a partial one:\n
+    the data goes to a temporary file in the same folder, is flushed to disk, then renamed over path."""
+    folder = os.path.dirname(os.path.abspath(path))
+    temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+    if fcntl is not None: # Persist the rename itself, directories cannot be opened on Windows
+        descriptor = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+class FileLock:
+    def __init__(self, path) -> None:
+        """Exclusive lock shared between processes, held on path + ".lock" for the duration of a with block."""
+        self.path = path + ".lock"
+        self.__lock = threading.Lock() # Lock files are per process, threads are serialised separately
+        self.__file = None
+
+    def __enter__(self):
+        self.__lock.acquire()
+        try:
+            self.__file = open(self.path, "a+")
+            if fcntl is not None:
+                fcntl.flock(self.__file.fileno(), fcntl.LOCK_EX)
+            else:
+                self.__file.seek(0)
+                msvcrt.locking(self.__file.fileno(), msvcrt.LK_LOCK, 1)
+        except BaseException:
+            if self.__file is not None:
+                self.__file.close()
+            self.__lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exception) -> None:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.__file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.__file.seek(0)
+                msvcrt.locking(self.__file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.__file.close()
+            self.__file = None
+            self.__lock.release()
+
+class CredentialFile:
+    def __init__(self, path, delay=0.5) -> None:
+        """JSON file shared by threads and processes. Every write is atomic (see atomicWrite) and made under a FileLock,\n
+        re-reading the file first so changes made by other processes are kept.\n
+        delay -> Seconds updates are held back for, so a burst of token refreshes costs a single write, 0 writes every update at once.\n
+        Pending updates are written on flush(), and at exit."""
+        self.path = path
+        self.delay = delay
+        self.writes = 0
+        self.__fileLock = FileLock(path)
+        self.__lock = threading.Lock()
+        self.__pending = []
+        self.__timer = None
+        atexit.register(self.flush)
+
+    def __readFile(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def read(self) -> dict:
+        """Returns the contents of the file, including updates not yet written."""
+        with self.__lock:
+            data = self.__readFile()
+            for change in self.__pending:
+                data = change(data)
+            return data
+
+    def update(self, change) -> None:
+        """Queues change(data) -> data, applied to the current contents of the file on the next write."""
+        with self.__lock:
+            self.__pending.append(change)
+            if self.delay > 0 and self.__timer is None:
+                self.__timer = threading.Timer(self.delay, self.flush)
+                self.__timer.daemon = True
+                self.__timer.start()
+        if self.delay <= 0:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes every pending update in one atomic write."""
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+            if not self.__pending:
+                return
+            with self.__fileLock:
+                data = self.__readFile()
+                for change in self.__pending:
+                    data = change(data)
+                atomicWrite(self.path, data)
+            self.__pending = []
+            self.writes += 1
+
+class JSONCredentialStore:
+    def __init__(self, path, delay=0.5) -> None:
+        """Backend storing every account in one CredentialFile, as {account: {"REFRESHKEY": refreshToken}}.\n
+        A single-account credentials.json is read as the account DEFAULT_ACCOUNT, and kept in that layout while it is the only account.\n
+        delay -> Seconds token updates are coalesced for before being written, see CredentialFile"""
+        self.path = path
+        self.file = CredentialFile(path, delay)
+
+    def __tokens(self, data) -> dict:
+        if isinstance(data.get("REFRESHKEY"), str):
+            return {DEFAULT_ACCOUNT: data["REFRESHKEY"]}
+        return {account: entry["REFRESHKEY"] for account, entry in data.items()}
+
+    def __data(self, tokens) -> dict:
+        if list(tokens) == [DEFAULT_ACCOUNT]:
+            return {"REFRESHKEY": tokens[DEFAULT_ACCOUNT]}
+        return {account: {"REFRESHKEY": refreshToken} for account, refreshToken in tokens.items()}
+
+    def load(self) -> dict:
+        return self.__tokens(self.file.read())
+
+    def save(self, account, refreshToken) -> None:
+        def change(data):
+            tokens = self.__tokens(data)
+            tokens[account] = refreshToken
+            return self.__data(tokens)
+        self.file.update(change)
+
+    def delete(self, account) -> None:
+        def change(data):
+            tokens = self.__tokens(data)
+            tokens.pop(account, None)
+            return self.__data(tokens)
+        self.file.update(change)
+
+    def flush(self) -> None:
+        """Writes any coalesced updates now."""
+        self.file.flush()
+
+class SQLiteCredentialStore:
+    def __init__(self, path) -> None:
+        """Backend storing one row per account in an SQLite database, suited to hundreds of accounts and several processes."""
+        import sqlite3 # Only needed by this store
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS credentials (account TEXT PRIMARY KEY, refresh_token TEXT NOT NULL)")
+
+    def load(self) -> dict:
+        with self.__lock:
+            return dict(self.__connection.execute("SELECT account, refresh_token FROM credentials").fetchall())
+
+    def save(self, account, refreshToken) -> None:
+        with self.__lock:
+            self.__connection.execute(
+                "INSERT INTO credentials (account, refresh_token) VALUES (?, ?) ON CONFLICT(account) DO UPDATE SET refresh_token = excluded.refresh_token",
+                (account, refreshToken)
+            )
+
+    def delete(self, account) -> None:
+        with self.__lock:
+            self.__connection.execute("DELETE FROM credentials WHERE account = ?", (account,))
+
+    def close(self) -> None:
+        self.__connection.close()
@@ -0,0 +1,68 @@
+import threading
+
+class HTTPSession:
+    def __init__(self, poolSize=10, keepAlive=True, timeout=(3.05, 10), http2=False, pooled=True) -> None:
+        """poolSize -> Maximum number of connections kept open per host\n
+        keepAlive -> Reuse connections between requests\n
+        timeout -> (connect, read) timeout in seconds applied to every request\n
+        http2 -> Use HTTP/2 where available (requires httpx with the http2 extra installed), otherwise HTTP/1.1 is used\n
+        pooled -> Set False to open a new connection for every request"""
+        self.poolSize = poolSize
+        self.keepAlive = keepAlive
+        self.timeout = timeout
+        self.pooled = pooled
+        self.http2 = False
+        self.__client = None
+        self.__lock = threading.Lock()
+
+        if http2 and pooled:
+            try:
+                import h2 # noqa: F401
+                import httpx
+            except ImportError:
+                pass
+            else:
+                self.http2 = True
+                self.__client = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=poolSize, max_keepalive_connections=poolSize if keepAlive else 0),
+                    timeout=httpx.Timeout(timeout[1], connect=timeout[0])
+                )
+
+    def __connect(self):
+        """Creates the requests session on the first request, so that importing and constructing a Spotify object does not import requests."""
+        import requests
+        from requests.adapters import HTTPAdapter
+        with self.__lock:
+            if self.__client is None:
+                client = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.poolSize, pool_maxsize=self.poolSize)
+                client.mount("https://", adapter)
+                client.mount("http://", adapter)
+                if not self.keepAlive:
+                    client.headers["Connection"] = "close"
+                self.__client = client
+        return self.__client
+
+    def request(self, method, url, headers=None, data=None):
+        """Sends an HTTP request over the shared connection pool and returns the response."""
+        if self.http2:
+            if isinstance(data, (str, bytes)):
+                return self.__client.request(method, url, headers=headers, content=data or None)
+            return self.__client.request(method, url, headers=headers, data=data)
+        if not self.pooled:
+            import requests
+            return requests.request(method, url, headers=headers, data=data, timeout=self.timeout)
+        client = self.__client if self.__client is not None else self.__connect()
+        return client.request(method, url, headers=headers, data=data, timeout=self.timeout)
+
+    def get(self, url, headers=None):
+        return self.request("GET", url, headers=headers)
+
+    def post(self, url, headers=None, data=None):
+        return self.request("POST", url, headers=headers, data=data)
+
+    def close(self) -> None:
+        """Closes every pooled connection."""
+        if self.__client is not None:
+            self.__client.close()
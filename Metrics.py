@@ -0,0 +1,181 @@
+"""Request instrumentation for Spotify and AsyncSpotify: pass metrics=RequestMetrics() (Prometheus text export), LogMetrics() (structured log lines),\n
+or any object with the methods of NullMetrics. The default NullMetrics records nothing, and the clients skip timing entirely when it is used."""
+import json
+import threading
+from urllib.parse import urlsplit
+
+# Path segments following these are IDs, replaced by {id} so that every playlist counts as one endpoint
+ID_COLLECTIONS = ("playlists", "tracks", "albums", "artists", "users", "shows", "episodes", "audiobooks", "chapters", "categories")
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def endpointName(url) -> str:
+    """Returns the path of a request URL with IDs replaced, e.g. /v1/playlists/{id}/tracks."""
+    parts = urlsplit(url).path.split("/")
+    for i in range(1, len(parts)):
+        if parts[i - 1] in ID_COLLECTIONS and parts[i]:
+            parts[i] = "{id}"
+    return "/".join(parts)
+
+class NullMetrics:
+    """Records nothing, and the interface a custom metrics sink implements."""
+    enabled = False
+
+    def request(self, method, endpoint, status, seconds, sent, received, retries) -> None:
+        """One API request: status of the final response, seconds including throttling and retries, bytes sent and received,\n
+        and retries made (after 429, 5xx or 401 responses)."""
+
+    def cache(self, endpoint, outcome) -> None:
+        """A ResponseCache lookup, outcome being "hit", "revalidated" (304) or "miss"."""
+
+    def tokenRefresh(self, success) -> None:
+        """An access token refresh."""
+
+class RequestMetrics:
+    enabled = True
+
+    def __init__(self, buckets=LATENCY_BUCKETS, prefix="spotify") -> None:
+        """In-memory counters and latency histograms per endpoint, exported with prometheus() or asDict().\n
+        buckets -> Upper bounds in seconds of the latency histogram buckets\n
+        prefix -> Prefix of the exported metric names"""
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self.requests = {} # (method, endpoint, status): count
+        self.latency = {} # endpoint: [bucket counts..., +Inf count, sum]
+        self.bytes = {} # (endpoint, direction): count
+        self.retries = {} # endpoint: count
+        self.caches = {} # (endpoint, outcome): count
+        self.tokenRefreshes = {"success": 0, "failure": 0}
+        self.__lock = threading.Lock()
+
+    def request(self, method, endpoint, status, seconds, sent, received, retries) -> None:
+        with self.__lock:
+            key = (method, endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get(endpoint)
+            if histogram is None:
+                histogram = self.latency[endpoint] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(self.buckets)] += 1
+            histogram[-1] += seconds
+            self.bytes[(endpoint, "sent")] = self.bytes.get((endpoint, "sent"), 0) + sent
+            self.bytes[(endpoint, "received")] = self.bytes.get((endpoint, "received"), 0) + received
+            if retries:
+                self.retries[endpoint] = self.retries.get(endpoint, 0) + retries
+
+    def cache(self, endpoint, outcome) -> None:
+        with self.__lock:
+            self.caches[(endpoint, outcome)] = self.caches.get((endpoint, outcome), 0) + 1
+
+    def tokenRefresh(self, success) -> None:
+        with self.__lock:
+            self.tokenRefreshes["success" if success else "failure"] += 1
+
+    def asDict(self) -> dict:
+        """Per endpoint totals: requests by status, latency sum and count, bytes, retries and cache outcomes."""
+        with self.__lock:
+            endpoints = {}
+
+            def entry(endpoint) -> dict:
+                return endpoints.setdefault(endpoint, {"requests": {}, "seconds": 0.0, "sent": 0, "received": 0, "retries": 0, "cache": {}})
+
+            for (method, endpoint, status), count in self.requests.items():
+                entry(endpoint)["requests"][f"{method} {status}"] = count
+            for endpoint, histogram in self.latency.items():
+                entry(endpoint)["seconds"] = histogram[-1]
+            for (endpoint, direction), count in self.bytes.items():
+                entry(endpoint)[direction] = count
+            for endpoint, count in self.retries.items():
+                entry(endpoint)["retries"] = count
+            for (endpoint, outcome), count in self.caches.items():
+                entry(endpoint)["cache"][outcome] = count
+            return {"endpoints": endpoints, "tokenRefreshes": dict(self.tokenRefreshes)}
+
+    def prometheus(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        name = self.prefix
+        lines = []
+        with self.__lock:
+            lines.append(f"# HELP {name}_requests_total Spotify API requests by final status.")
+            lines.append(f"# TYPE {name}_requests_total counter")
+            for (method, endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f'{name}_requests_total{{method="{method}",endpoint="{endpoint}",status="{status}"}} {count}')
+
+            lines.append(f"# HELP {name}_request_duration_seconds Spotify API request latency, including throttling and retries.")
+            lines.append(f"# TYPE {name}_request_duration_seconds histogram")
+            for endpoint, histogram in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), histogram):
+                    cumulative += count
+                    lines.append(f'{name}_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_request_duration_seconds_sum{{endpoint="{endpoint}"}} {histogram[-1]}')
+                lines.append(f'{name}_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+
+            lines.append(f"# HELP {name}_request_bytes_total Bytes of request and response bodies.")
+            lines.append(f"# TYPE {name}_request_bytes_total counter")
+            for (endpoint, direction), count in sorted(self.bytes.items()):
+                lines.append(f'{name}_request_bytes_total{{endpoint="{endpoint}",direction="{direction}"}} {count}')
+
+            lines.append(f"# HELP {name}_request_retries_total Requests sent again after a 429, 5xx or 401 response.")
+            lines.append(f"# TYPE {name}_request_retries_total counter")
+            for endpoint, count in sorted(self.retries.items()):
+                lines.append(f'{name}_request_retries_total{{endpoint="{endpoint}"}} {count}')
+
+            lines.append(f"# HELP {name}_cache_total Response cache lookups by outcome.")
+            lines.append(f"# TYPE {name}_cache_total counter")
+            for (endpoint, outcome), count in sorted(self.caches.items()):
+                lines.append(f'{name}_cache_total{{endpoint="{endpoint}",outcome="{outcome}"}} {count}')
+
+            lines.append(f"# HELP {name}_token_refreshes_total Access token refreshes.")
+            lines.append(f"# TYPE {name}_token_refreshes_total counter")
+            for outcome, count in sorted(self.tokenRefreshes.items()):
+                lines.append(f'{name}_token_refreshes_total{{outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+class LogMetrics:
+    enabled = True
+
+    def __init__(self, logger=None, level=None) -> None:
+        """Writes every record as one JSON log line, e.g. {"event": "request", "endpoint": "/v1/me/player", "status": 200, ...}.\n
+        logger -> logging.Logger to write to, "spotify.metrics" if not given\n
+        level -> Level the lines are logged at, logging.INFO if not given"""
+        import logging # Imported here so that the clients, which always import Metrics, do not pay for it
+        self.logger = logger if logger is not None else logging.getLogger("spotify.metrics")
+        self.level = level if level is not None else logging.INFO
+
+    def __log(self, record) -> None:
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, json.dumps(record))
+
+    def request(self, method, endpoint, status, seconds, sent, received, retries) -> None:
+        self.__log({"event": "request", "method": method, "endpoint": endpoint, "status": status, "seconds": round(seconds, 6), "sent": sent, "received": received, "retries": retries})
+
+    def cache(self, endpoint, outcome) -> None:
+        self.__log({"event": "cache", "endpoint": endpoint, "outcome": outcome})
+
+    def tokenRefresh(self, success) -> None:
+        self.__log({"event": "token_refresh", "success": success})
+
+class MetricsGroup:
+    enabled = True
+
+    def __init__(self, *sinks) -> None:
+        """Sends every record to several sinks, e.g. MetricsGroup(RequestMetrics(), LogMetrics())."""
+        self.sinks = sinks
+
+    def request(self, *args) -> None:
+        for sink in self.sinks:
+            sink.request(*args)
+
+    def cache(self, endpoint, outcome) -> None:
+        for sink in self.sinks:
+            sink.cache(endpoint, outcome)
+
+    def tokenRefresh(self, success) -> None:
+        for sink in self.sinks:
+            sink.tokenRefresh(success)
@@ -0,0 +1,249 @@
+"""Polls each account once and fans its formatted playback out to any number of readers:\n
+Server-Sent Events streams of diff-only updates, a plain JSON endpoint (with ETags) small enough for uSpotify devices,\n
+and the album art pre-scaled for their displays when given an AlbumArt.ArtCache."""
+import asyncio
+import inspect
+import json
+import secrets
+from urllib.parse import urlsplit, unquote
+
+# Other Programs
+from PlaybackWatcher import PlaybackWatcher
+from SpotifyCore import contextUrl, needsPlaylistArt, setPlaylistArt
+from TrackSnapshot import extractSnapshot
+
+STATUS_TEXT = {200: "OK", 204: "No Content", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+def artUrl(state) -> str:
+    """URL the art renditions of a formatted playback are scaled from, the largest image available."""
+    if state is None:
+        return None
+    return state.get("hq_art") or state.get("art")
+
+def snapshotDiff(current, previous) -> dict:
+    """Returns the fields of the formatted playback current which differ from previous."""
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+class PlaybackServer:
+    def __init__(self, clients, host="127.0.0.1", port=8080, keepAlive=15, queueSize=32, art=None, **watcherOptions) -> None:
+        """clients - {account: Spotify or AsyncSpotify object}, e.g. {account: pool[account] for account in pool} for a SpotifyPool\n
+        host, port -> Address to listen on (port 0 picks a free one, see url)\n
+        keepAlive -> Seconds between comments sent on idle event streams, so proxies keep them open\n
+        queueSize -> Updates buffered per subscriber. A subscriber falling further behind is sent the full state instead\n
+        art -> AlbumArt.ArtCache serving the art of the current track, prefetched in the background whenever it changes\n
+        watcherOptions -> Passed to every PlaybackWatcher, e.g. minInterval=2\n
+        Endpoints:\n
+        GET /accounts -> JSON list of the account names\n
+        GET /playback/{account} -> Last known formatted playback (204 when nothing is playing), 304 if If-None-Match holds the current ETag\n
+        GET /events/{account} -> Server-Sent Events: a "snapshot" event with the full state, then a "diff" event holding only the changed fields of each update\n
+        GET /art/{account}/{rendition} -> Art of the current track in one of the ArtCache renditions (204 when there is none), with an ETag"""
+        self.host = host
+        self.port = port
+        self.keepAlive = keepAlive
+        self.queueSize = queueSize
+        self.art = art
+        self.clients = dict(clients)
+        self.watchers = {account: PlaybackWatcher(client, **watcherOptions) for account, client in self.clients.items()}
+        self.states = {account: None for account in self.clients} # Last formatted playback, None when nothing is playing
+        self.versions = {account: 0 for account in self.clients}
+
+        self.__epoch = secrets.token_hex(4)
+        self.__subscribers = {account: set() for account in self.clients}
+        self.__server = None
+        self.__tasks = []
+
+        for account, watcher in self.watchers.items():
+            for event in ("track_changed", "paused", "resumed"):
+                watcher.on(event, lambda current, previous, account=account: self.__update(account, current))
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def etag(self, account) -> str:
+        return f'"{self.__eventID(self.versions[account])}"'
+
+    def __eventID(self, version) -> str:
+        """Qualified by the epoch, so ids and ETags from a previous run never match."""
+        return f"{self.__epoch}-{version}"
+
+    async def __call(self, function, *args) -> tuple:
+        if inspect.iscoroutinefunction(function):
+            return await function(*args)
+        return await asyncio.to_thread(function, *args)
+
+    async def __format(self, account, data) -> dict:
+        """The formatted playback of a /v1/me/player response, falling back to the playlist image as requestFormattedPlayback does."""
+        if data is None:
+            return None
+        snapshot = extractSnapshot(data)
+        playlist = needsPlaylistArt(snapshot, contextUrl(data))
+        if playlist is not None:
+            setPlaylistArt(snapshot, (await self.__call(self.clients[account].getPlaylistImage, playlist))[0])
+        return snapshot.asDict()
+
+    async def __update(self, account, data) -> None:
+        state = await self.__format(account, data)
+        previous = self.states[account]
+        if state == previous:
+            return
+        self.states[account] = state
+        self.versions[account] += 1
+        if self.art is not None and artUrl(state) is not None and artUrl(state) != artUrl(previous):
+            asyncio.get_running_loop().run_in_executor(None, self.__prefetch, artUrl(state))
+        if state is None or previous is None:
+            message = ("snapshot", state)
+        else:
+            message = ("diff", snapshotDiff(state, previous))
+        for queue in self.__subscribers[account]:
+            if queue.full(): # Too far behind for diffs to apply, its backlog is replaced with the full state
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait((self.versions[account], ("snapshot", state)))
+            else:
+                queue.put_nowait((self.versions[account], message))
+
+    def __prefetch(self, url) -> None:
+        try:
+            self.art.prefetch(url)
+        except OSError: # Unreachable or undecodable, the art request tries again
+            pass
+
+    def subscribe(self, account) -> asyncio.Queue:
+        """Returns a queue receiving (version, (event, data)) for every update of an account, event being "snapshot" or "diff".\n
+        Used by the event streams, and by consumers running on the same event loop. Call unsubscribe when done."""
+        queue = asyncio.Queue(self.queueSize)
+        self.__subscribers[account].add(queue)
+        return queue
+
+    def unsubscribe(self, account, queue) -> None:
+        self.__subscribers[account].discard(queue)
+
+    def subscribers(self, account) -> int:
+        return len(self.__subscribers[account])
+
+    async def start(self):
+        """Starts listening and polling every account."""
+        self.__server = await asyncio.start_server(self.__handle, self.host, self.port)
+        self.port = self.__server.sockets[0].getsockname()[1]
+        self.__tasks = [asyncio.create_task(watcher.run()) for watcher in self.watchers.values()]
+        return self
+
+    async def serve(self) -> None:
+        """Starts the server and runs until cancelled."""
+        await self.start()
+        try:
+            await self.__server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self) -> None:
+        for watcher in self.watchers.values():
+            watcher.stop()
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+    async def __handle(self, reader, writer) -> None:
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = requestLine.decode("latin-1").split()
+                except ValueError:
+                    await self.__respond(writer, 400, close=True)
+                    break
+                close = version == "HTTP/1.0" or headers.get("connection", "").lower() == "close"
+                if not await self.__route(writer, method, unquote(urlsplit(target).path), headers, close) or close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError): # Reader gone or server stopping
+            pass
+        finally:
+            writer.close()
+
+    async def __route(self, writer, method, path, headers, close) -> bool:
+        """Answers one request, returns False once the connection must be closed."""
+        parts = path.strip("/").split("/")
+        if method != "GET":
+            await self.__respond(writer, 405, close=close)
+        elif parts == ["accounts"]:
+            await self.__respond(writer, 200, json.dumps(list(self.clients)).encode(), close=close)
+        elif len(parts) == 2 and parts[1] in self.clients and parts[0] == "playback":
+            account = parts[1]
+            etag = self.etag(account)
+            if headers.get("if-none-match") == etag:
+                await self.__respond(writer, 304, etag=etag, close=close)
+            elif self.states[account] is None:
+                await self.__respond(writer, 204, etag=etag, close=close)
+            else:
+                body = json.dumps(self.states[account], separators=(",", ":")).encode()
+                await self.__respond(writer, 200, body, etag=etag, close=close)
+        elif len(parts) == 2 and parts[1] in self.clients and parts[0] == "events":
+            await self.__stream(writer, parts[1], headers.get("last-event-id"))
+            return False
+        elif len(parts) == 3 and parts[1] in self.clients and parts[0] == "art" and self.art is not None and parts[2] in self.art.renditions:
+            url = artUrl(self.states[parts[1]])
+            if url is None:
+                await self.__respond(writer, 204, close=close)
+            elif headers.get("if-none-match") == self.art.etag(url, parts[2]):
+                await self.__respond(writer, 304, etag=self.art.etag(url, parts[2]), close=close)
+            else:
+                try:
+                    data = await asyncio.to_thread(self.art.get, url, parts[2])
+                except OSError:
+                    data = None
+                if data is None:
+                    await self.__respond(writer, 204, close=close)
+                else:
+                    await self.__respond(writer, 200, data, etag=self.art.etag(url, parts[2]), contentType=self.art.contentType(parts[2]), close=close)
+        else:
+            await self.__respond(writer, 404, close=close)
+        return True
+
+    async def __respond(self, writer, status, body=b"", etag=None, contentType="application/json", close=False) -> None:
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}"]
+        if status == 200:
+            head.append(f"Content-Type: {contentType}")
+        if etag is not None:
+            head.append(f"ETag: {etag}")
+        if status not in (204, 304):
+            head.append(f"Content-Length: {len(body)}")
+        if close:
+            head.append("Connection: close")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def __stream(self, writer, account, lastEventID) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        queue = self.subscribe(account)
+        try:
+            # A reconnecting reader which already holds the current version is not sent it again
+            if lastEventID != self.__eventID(self.versions[account]):
+                writer.write(self.__event(self.versions[account], "snapshot", self.states[account]))
+            await writer.drain()
+            while True:
+                try:
+                    version, (event, data) = await asyncio.wait_for(queue.get(), self.keepAlive)
+                    writer.write(self.__event(version, event, data))
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+                await writer.drain()
+        finally:
+            self.unsubscribe(account, queue)
+
+    def __event(self, version, event, data) -> bytes:
+        return f"id: {self.__eventID(version)}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
@@ -0,0 +1,128 @@
+"""Watches a users playback and emits events when it changes, polling only as often as needed."""
+import asyncio
+import inspect
+import time
+
+EVENTS = ("track_changed", "paused", "resumed", "seeked")
+
+class PlaybackWatcher:
+    def __init__(self, client, minInterval=1, maxInterval=15, pausedInterval=5, idleInterval=60, seekTolerance=3000, endMargin=0.5) -> None:
+        """client - Spotify or AsyncSpotify object to poll\n
+        minInterval, maxInterval -> Bounds in seconds on the wait between polls while playing. Polls are timed for the expected end of the track\n
+        pausedInterval -> First wait while paused, doubled on each unchanged poll up to maxInterval\n
+        idleInterval -> Longest wait while nothing is playing (204 No Content), backing off from pausedInterval\n
+        seekTolerance -> Milliseconds the progress may drift from its expected value before a seek is reported\n
+        endMargin -> Seconds after the expected end of a track at which to poll"""
+        self.client = client
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.pausedInterval = pausedInterval
+        self.idleInterval = idleInterval
+        self.seekTolerance = seekTolerance
+        self.endMargin = endMargin
+
+        self.state = None # Last /v1/me/player response, None when nothing is playing
+        self.polls = 0
+        self.errors = 0 # Polls which raised, e.g. a timeout or connection error
+        self.lastError = None
+        self.__polledAt = 0.0
+        self.__backoff = pausedInterval
+        self.__callbacks = {event: [] for event in EVENTS}
+        self.__running = False
+        self.__async = inspect.iscoroutinefunction(client.requestPlayback)
+
+    def on(self, event, callback=None):
+        """Registers callback(current, previous) for one of EVENTS, both arguments being /v1/me/player responses\n
+        (current is None when playback stopped entirely, previous is None on the first track seen).\n
+        Callbacks may be plain functions or coroutine functions. Can be used as a decorator."""
+        if event not in self.__callbacks:
+            raise ValueError(f"Unknown event {event}, expected one of {EVENTS}")
+        if callback is None:
+            return lambda function: self.on(event, function)
+        self.__callbacks[event].append(callback)
+        return callback
+
+    async def __emit(self, event, current, previous) -> None:
+        for callback in self.__callbacks[event]:
+            result = callback(current, previous)
+            if inspect.isawaitable(result):
+                await result
+
+    async def __requestPlayback(self) -> tuple:
+        if self.__async:
+            return await self.client.requestPlayback()
+        return await asyncio.to_thread(self.client.requestPlayback)
+
+    async def poll(self) -> float:
+        """Polls the playback once, emits any events and returns the seconds to wait before the next poll."""
+        data, statusCode = await self.__requestPlayback()
+        polledAt = time.monotonic()
+        self.polls += 1
+
+        if statusCode != 200 or not isinstance(data, dict) or not data.get("item"):
+            if statusCode == 204 and self.state is not None and self.state.get("is_playing"):
+                await self.__emit("paused", None, self.state)
+            if statusCode == 204:
+                self.state = None
+            return self.__idleWait()
+
+        previous, elapsed = self.state, polledAt - self.__polledAt
+        self.state, self.__polledAt = data, polledAt
+        await self.__compare(data, previous, elapsed)
+
+        if not data.get("is_playing"):
+            wait = self.__backoff
+            self.__backoff = min(self.__backoff * 2, self.maxInterval)
+            return wait
+        self.__backoff = self.pausedInterval
+        remaining = (data["item"].get("duration_ms", 0) - data.get("progress_ms", 0)) / 1000
+        return max(self.minInterval, min(self.maxInterval, remaining + self.endMargin))
+
+    def __idleWait(self) -> float:
+        """Seconds to wait while nothing can be read, backing off up to idleInterval."""
+        wait = self.__backoff
+        self.__backoff = min(self.__backoff * 2, self.idleInterval)
+        return wait
+
+    async def __compare(self, current, previous, elapsed) -> None:
+        """Emits events for the differences between two polls."""
+        if previous is None or previous["item"].get("id") != current["item"].get("id"):
+            await self.__emit("track_changed", current, previous)
+            if previous is not None and previous.get("is_playing") != current.get("is_playing"):
+                await self.__emit("resumed" if current.get("is_playing") else "paused", current, previous)
+            return
+
+        if previous.get("is_playing") and not current.get("is_playing"):
+            await self.__emit("paused", current, previous)
+            return
+        elif not previous.get("is_playing") and current.get("is_playing"):
+            await self.__emit("resumed", current, previous)
+            return
+
+        # Progress can only be predicted while the play state is unchanged
+        expected = previous.get("progress_ms", 0)
+        if previous.get("is_playing"):
+            expected += elapsed * 1000
+        if abs(current.get("progress_ms", 0) - expected) > self.seekTolerance:
+            await self.__emit("seeked", current, previous)
+
+    async def run(self) -> None:
+        """Polls until stop() is called. A poll which raises (e.g. the API cannot be reached) is counted in errors\n
+        and retried after the same back off as when nothing is playing, the last known state being kept meanwhile."""
+        self.__running = True
+        while self.__running:
+            try:
+                wait = await self.poll()
+            except Exception as error:
+                self.errors += 1
+                self.lastError = error
+                wait = self.__idleWait()
+            await asyncio.sleep(wait)
+
+    def stop(self) -> None:
+        """Stops run() after the current wait."""
+        self.__running = False
+
+async def watchAll(watchers) -> None:
+    """Runs many PlaybackWatchers, e.g. one per account, on the same event loop."""
+    await asyncio.gather(*(watcher.run() for watcher in watchers))
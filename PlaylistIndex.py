@@ -0,0 +1,118 @@
+"""Local SQLite index of whole playlists, re-downloaded only when their snapshot_id changes."""
+import sqlite3
+import threading
+import time
+
+# Other Programs
+from SpotifyCore import PlaylistTrack
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (id TEXT PRIMARY KEY, snapshot_id TEXT, name TEXT, synced REAL);
+CREATE TABLE IF NOT EXISTS tracks (
+    playlist TEXT NOT NULL, position INTEGER NOT NULL, id TEXT, uri TEXT, name TEXT, name_key TEXT, artists TEXT,
+    PRIMARY KEY (playlist, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tracks_id ON tracks (id, playlist);
+CREATE INDEX IF NOT EXISTS tracks_name ON tracks (playlist, name_key);
+"""
+
+class PlaylistIndex:
+    def __init__(self, client, path=":memory:", prefetch=4) -> None:
+        """client - Spotify object the playlists are downloaded with\n
+        path -> SQLite database file, kept between runs so unchanged playlists are never downloaded again\n
+        prefetch -> Pages downloaded concurrently while syncing, see Spotify.iterPlaylistItems"""
+        self.client = client
+        self.path = path
+        self.prefetch = prefetch
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.executescript(SCHEMA)
+        self.__members = {} # Playlist ID: set of track IDs, loaded on the first contains() after each sync
+
+    def snapshotID(self, playlistID) -> str:
+        """The snapshot_id the playlist was last synced at, None if it never was."""
+        with self.__lock:
+            row = self.__connection.execute("SELECT snapshot_id FROM playlists WHERE id = ?", (playlistID,)).fetchone()
+        return row[0] if row else None
+
+    def sync(self, playlistID, force=False) -> bool:
+        """Downloads the playlist if its snapshot_id differs from the indexed one (or force is set).\n
+        Returns True if it was downloaded, False if the index was already up to date or the playlist could not be read."""
+        # Revalidated past the response cache, whose fresh entries could hide a new snapshot_id for their TTL
+        details, statusCode = self.client.getPlaylist(playlistID, "snapshot_id,name,tracks.total", revalidate=True)
+        if statusCode != 200:
+            return False
+        snapshotID = details.get("snapshot_id")
+        if not force and snapshotID is not None and snapshotID == self.snapshotID(playlistID):
+            return False
+
+        # Items without a track are counted against the total, but not indexed
+        items = list(self.client.iterPlaylistItems(playlistID, prefetch=self.prefetch, skipMissing=False))
+        if len(items) < details.get("tracks", {}).get("total", 0):
+            return False # A page could not be read, the index is left as it was and the next sync tries again
+        rows = [
+            (playlistID, track.position, track.id, track.uri, track.name, (track.name or "").casefold(), track.artists)
+            for track in items if track.uri is not None
+        ]
+        with self.__lock, self.__connection:
+            self.__connection.execute("DELETE FROM tracks WHERE playlist = ?", (playlistID,))
+            self.__connection.executemany("INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?)",
+                (playlistID, snapshotID, details.get("name"), time.time())
+            )
+            self.__members.pop(playlistID, None)
+        return True
+
+    def contains(self, playlistID, trackID) -> bool:
+        """True if the track is in the indexed playlist, answered from memory after the first call."""
+        members = self.__members.get(playlistID)
+        if members is None:
+            with self.__lock:
+                members = {row[0] for row in self.__connection.execute("SELECT id FROM tracks WHERE playlist = ?", (playlistID,))}
+                self.__members[playlistID] = members
+        return trackID in members
+
+    def positions(self, playlistID, trackID) -> list:
+        """Positions of a track in the indexed playlist (a track may appear more than once)."""
+        with self.__lock:
+            return [row[0] for row in self.__connection.execute(
+                "SELECT position FROM tracks WHERE id = ? AND playlist = ? ORDER BY position", (trackID, playlistID)
+            )]
+
+    def playlistsContaining(self, trackID) -> list:
+        """IDs of every indexed playlist containing the track."""
+        with self.__lock:
+            return [row[0] for row in self.__connection.execute("SELECT DISTINCT playlist FROM tracks WHERE id = ?", (trackID,))]
+
+    def search(self, playlistID, prefix, limit=20) -> list:
+        """PlaylistTrack records of the indexed playlist whose name starts with prefix (case insensitive)."""
+        prefix = prefix.casefold()
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT position, id, uri, name, artists FROM tracks WHERE playlist = ? AND name_key >= ? AND name_key < ? ORDER BY name_key, position LIMIT ?",
+                (playlistID, prefix, prefix + "\U0010ffff", limit)
+            ).fetchall()
+        return [PlaylistTrack(*row) for row in rows]
+
+    def tracks(self, playlistID) -> list:
+        """Every PlaylistTrack of the indexed playlist, in order."""
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT position, id, uri, name, artists FROM tracks WHERE playlist = ? ORDER BY position", (playlistID,)
+            ).fetchall()
+        return [PlaylistTrack(*row) for row in rows]
+
+    def playlists(self) -> dict:
+        """{playlistID: name} of every indexed playlist."""
+        with self.__lock:
+            return dict(self.__connection.execute("SELECT id, name FROM playlists").fetchall())
+
+    def remove(self, playlistID) -> None:
+        with self.__lock, self.__connection:
+            self.__connection.execute("DELETE FROM tracks WHERE playlist = ?", (playlistID,))
+            self.__connection.execute("DELETE FROM playlists WHERE id = ?", (playlistID,))
+            self.__members.pop(playlistID, None)
+
+    def close(self) -> None:
+        self.__connection.close()
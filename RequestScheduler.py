@@ -0,0 +1,177 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# Priority lanes, lower numbers are sent first
+PRIORITY_USER = 0 # User facing actions, e.g. skip and addToQueue
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2 # Polling
+
+# Methods safe to send again after a 5xx, which may have come after the API already acted on the request (e.g. queued a track)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+class TokenBucket:
+    def __init__(self, rate=10, burst=20) -> None:
+        """Client-side throttle shared by the schedulers.\n
+        rate -> Requests per second allowed on average\n
+        burst -> Requests which may be sent at once after a quiet period"""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blockedUntil = 0.0 # Set from Retry-After, nothing is sent before this time
+
+    def take(self) -> float:
+        """Takes a token and returns 0, or returns the seconds to wait before one is available."""
+        now = time.monotonic()
+        if now < self.blockedUntil:
+            return self.blockedUntil - now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds) -> None:
+        """Stops every lane from sending for seconds."""
+        self.blockedUntil = max(self.blockedUntil, time.monotonic() + seconds)
+
+def retryAfter(response, default=1.0) -> float:
+    """Seconds to wait from the Retry-After header of a 429 response."""
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
+
+class SchedulerStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.throttled = 0 # 429 responses
+        self.retries = 0
+        self.lanes = {}
+
+    def queued(self, priority, seconds) -> None:
+        """Records the time a request waited in its lane before being sent."""
+        lane = self.lanes.setdefault(priority, {"requests": 0, "queuedTime": 0.0, "maxQueuedTime": 0.0})
+        lane["requests"] += 1
+        lane["queuedTime"] += seconds
+        lane["maxQueuedTime"] = max(lane["maxQueuedTime"], seconds)
+
+    def asDict(self) -> dict:
+        return {"requests": self.requests, "throttled": self.throttled, "retries": self.retries, "lanes": self.lanes}
+
+class RequestScheduler:
+    def __init__(self, rate=10, burst=20, maxRetries=3, backoff=0.5, maxBackoff=30) -> None:
+        """Sends every request of one or more Spotify objects through a token bucket, in priority order.\n
+        rate, burst -> Client-side throttle, see TokenBucket\n
+        maxRetries -> Attempts made after a 429 or 5xx response before it is returned to the caller. 5xx responses are only retried for idempotent requests\n
+        backoff, maxBackoff -> Base and cap in seconds of the exponential backoff (with jitter) after a 5xx response"""
+        self.bucket = TokenBucket(rate, burst)
+        self.maxRetries = maxRetries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.stats = SchedulerStats()
+        self.__condition = threading.Condition()
+        self.__waiting = []
+        self.__sequence = itertools.count()
+
+    def acquire(self, priority=PRIORITY_DEFAULT) -> float:
+        """Blocks until the request may be sent, returning the seconds spent queued."""
+        start = time.monotonic()
+        entry = (priority, next(self.__sequence))
+        with self.__condition:
+            heapq.heappush(self.__waiting, entry)
+            while True:
+                if self.__waiting[0] != entry:
+                    self.__condition.wait()
+                    continue
+                wait = self.bucket.take()
+                if wait == 0:
+                    heapq.heappop(self.__waiting)
+                    self.__condition.notify_all()
+                    break
+                self.__condition.wait(wait)
+        queued = time.monotonic() - start
+        self.stats.queued(priority, queued)
+        return queued
+
+    def execute(self, send, priority=PRIORITY_DEFAULT, idempotent=True):
+        """Calls send() once a token is available, retrying 429 (after Retry-After) and 5xx (with backoff) responses.\n
+        idempotent -> False for requests which must not be sent twice (e.g. POST), whose 5xx responses are returned as they are"""
+        attempt = 0
+        while True:
+            self.acquire(priority)
+            self.stats.requests += 1
+            response = send()
+            if attempt >= self.maxRetries:
+                return response
+            if response.status_code == 429:
+                self.stats.throttled += 1
+                self.bucket.pause(retryAfter(response))
+            elif response.status_code >= 500 and idempotent:
+                time.sleep(min(self.maxBackoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5))
+            else:
+                return response
+            attempt += 1
+            self.stats.retries += 1
+
+class AsyncRequestScheduler:
+    def __init__(self, rate=10, burst=20, maxRetries=3, backoff=0.5, maxBackoff=30) -> None:
+        """asyncio counterpart of RequestScheduler, for AsyncSpotify objects sharing one event loop."""
+        import asyncio # Imported here so that RequestScheduler users do not pay for it
+        self.bucket = TokenBucket(rate, burst)
+        self.maxRetries = maxRetries
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.stats = SchedulerStats()
+        self.__condition = asyncio.Condition()
+        self.__waiting = []
+        self.__sequence = itertools.count()
+
+    async def acquire(self, priority=PRIORITY_DEFAULT) -> float:
+        """Waits until the request may be sent, returning the seconds spent queued."""
+        import asyncio
+        start = time.monotonic()
+        entry = (priority, next(self.__sequence))
+        async with self.__condition:
+            heapq.heappush(self.__waiting, entry)
+            while True:
+                if self.__waiting[0] != entry:
+                    await self.__condition.wait()
+                    continue
+                wait = self.bucket.take()
+                if wait == 0:
+                    heapq.heappop(self.__waiting)
+                    self.__condition.notify_all()
+                    break
+                try:
+                    await asyncio.wait_for(self.__condition.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        queued = time.monotonic() - start
+        self.stats.queued(priority, queued)
+        return queued
+
+    async def execute(self, send, priority=PRIORITY_DEFAULT, idempotent=True):
+        """Awaits send() once a token is available, retrying 429 (after Retry-After) and 5xx (with backoff) responses.\n
+        idempotent -> False for requests which must not be sent twice (e.g. POST), whose 5xx responses are returned as they are"""
+        import asyncio
+        attempt = 0
+        while True:
+            await self.acquire(priority)
+            self.stats.requests += 1
+            response = await send()
+            if attempt >= self.maxRetries:
+                return response
+            if response.status_code == 429:
+                self.stats.throttled += 1
+                self.bucket.pause(retryAfter(response))
+            elif response.status_code >= 500 and idempotent:
+                await asyncio.sleep(min(self.maxBackoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5))
+            else:
+                return response
+            attempt += 1
+            self.stats.retries += 1
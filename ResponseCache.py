@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from fnmatch import fnmatch
+from urllib.parse import urlsplit
+
+# Seconds a cached response is served without asking the API, matched against the URL path.
+# Once stale, responses with an ETag are revalidated with If-None-Match instead of being downloaded again.
+DEFAULT_TTLS = {
+    "/v1/playlists/*/images": 3600,
+    "/v1/playlists/*/tracks": 60,
+    "/v1/playlists/*": 60,
+    "/v1/search": 300
+}
+
+class MemoryCache:
+    def __init__(self, maxEntries=512) -> None:
+        """In-memory LRU backend.\n
+        maxEntries -> Least recently used entries are evicted beyond this size. Entries are not weighed, so memory use is only bounded\n
+        by maxEntries times the largest response cached (e.g. a page of /v1/playlists/{id}/tracks is a few hundred KB)"""
+        self.maxEntries = maxEntries
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key) -> dict:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry) -> None:
+        with self.__lock:
+            self.__entries[key] = entry
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.maxEntries:
+                self.__entries.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+class DiskCache:
+    def __init__(self, folder, maxEntries=4096) -> None:
+        """On-disk LRU backend storing one JSON file per entry, so cached responses survive restarts.\n
+        folder -> Directory the entries are kept in, created if missing\n
+        maxEntries -> Least recently used entries (by file modification time) are evicted beyond this size"""
+        self.folder = folder
+        self.maxEntries = maxEntries
+        self.__lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self.__count = len(self.__files())
+
+    def __path(self, key) -> str:
+        return os.path.join(self.folder, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def __files(self) -> list:
+        return [os.path.join(self.folder, name) for name in os.listdir(self.folder) if name.endswith(".json")]
+
+    def get(self, key) -> dict:
+        path = self.__path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def set(self, key, entry) -> None:
+        path = self.__path(key)
+        with self.__lock:
+            if not os.path.exists(path):
+                self.__count += 1
+            temp = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp, "w") as f:
+                json.dump(entry, f)
+            os.replace(temp, path)
+            if self.__count > self.maxEntries:
+                self.__evict()
+
+    def __evict(self) -> None:
+        """Removes the least recently used files until the cache is back to 90% of maxEntries."""
+        files = sorted(self.__files(), key=lambda path: os.stat(path).st_mtime)
+        excess = len(files) - int(self.maxEntries * 0.9)
+        for path in files[:max(excess, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.__count = len(files) - max(excess, 0)
+
+    def delete(self, key) -> None:
+        with self.__lock:
+            try:
+                os.remove(self.__path(key))
+                self.__count -= 1
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self.__lock:
+            for path in self.__files():
+                os.remove(path)
+            self.__count = 0
+
+    def __len__(self) -> int:
+        return self.__count
+
+class ResponseCache:
+    def __init__(self, backend=None, ttls=None, namespace=None) -> None:
+        """Caches GET responses of read endpoints.\n
+        backend -> MemoryCache (default) or DiskCache, or any object with get/set/delete/clear\n
+        ttls -> Dictionary of URL path pattern to seconds, defaults to DEFAULT_TTLS. Paths matching no pattern are never cached\n
+        namespace -> Prefix of every key, see namespaced"""
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttls = ttls if ttls is not None else DEFAULT_TTLS
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.__namespaces = {}
+        self.__lock = threading.Lock()
+
+    def namespaced(self, namespace) -> "ResponseCache":
+        """Returns a cache sharing this one's backend and TTLs whose entries are only visible to itself, e.g. one per account,\n
+        as responses to the same URL (private playlists, search) differ between the users whose tokens requested them."""
+        with self.__lock:
+            cache = self.__namespaces.get(namespace)
+            if cache is None:
+                cache = self.__namespaces[namespace] = ResponseCache(self.backend, self.ttls, namespace)
+            return cache
+
+    def __key(self, url) -> str:
+        if self.namespace is None:
+            return url
+        return f"{self.namespace} {url}" # URLs never contain spaces, so keys of different namespaces cannot collide
+
+    def ttlFor(self, url) -> int:
+        """Returns the TTL configured for url, or None if it should not be cached."""
+        path = urlsplit(url).path
+        for pattern, ttl in self.ttls.items():
+            if fnmatch(path, pattern):
+                return ttl
+        return None
+
+    def lookup(self, url) -> tuple:
+        """Returns (entry, fresh) for url. entry is None on a miss, fresh entries can be used without a request."""
+        entry = self.backend.get(self.__key(url))
+        if entry is not None and entry["expires"] > time.time():
+            self.hits += 1
+            return entry, True
+        self.misses += 1
+        return entry, False
+
+    def store(self, url, data, statusCode, etag=None) -> None:
+        """Caches a response for its endpoint's TTL."""
+        ttl = self.ttlFor(url)
+        if ttl is None:
+            return
+        self.backend.set(self.__key(url), {"data": data, "status": statusCode, "etag": etag, "expires": time.time() + ttl})
+
+    def revalidated(self, url, entry) -> None:
+        """Extends a stale entry after the API answered 304 Not Modified."""
+        self.revalidations += 1
+        entry["expires"] = time.time() + (self.ttlFor(url) or 0)
+        self.backend.set(self.__key(url), entry)
+
+    def stats(self) -> dict:
+        """Hit, miss and revalidation counters, including those of the namespaced caches."""
+        caches = [self] + list(self.__namespaces.values())
+        return {
+            "hits": sum(cache.hits for cache in caches),
+            "misses": sum(cache.misses for cache in caches),
+            "revalidations": sum(cache.revalidations for cache in caches),
+            "entries": len(self.backend)
+        }
@@ -1,242 +1,354 @@
-import requests
 import json    
-from datetime import datetime
+import secrets
+import threading
+import time
 
 # Other Programs
-from URLEncoding import urlencoding
+from SpotifyCore import (
+    authorizeUrl, tokenUrl, playbackUrl, searchUrl, addToQueueUrl, queueUrl, skipUrl, playlistUrl, playlistItemsUrl, playlistImageUrl,
+    authorizationCodeForm, refreshTokenForm, tokenRequest, tokenResult, responseResult, cacheLookup, cacheResult, contextUrl, needsPlaylistArt, setPlaylistArt,
+    playlistTracks, PLAYLIST_TRACK_FIELDS, firstTrackURI, queueURIs, batchResults, batchStatus
+)
+from CredentialStore import CredentialFile
+from Authorization import pkcePair, AuthorizationError
+from TokenManager import TokenManager
+from HTTPSession import HTTPSession
+from ResponseCache import ResponseCache
+from Metrics import NullMetrics, endpointName
+from RequestScheduler import RequestScheduler, PRIORITY_USER, PRIORITY_DEFAULT, PRIORITY_BACKGROUND, IDEMPOTENT_METHODS
+from TrackSnapshot import TrackSnapshot, extractSnapshot
 
 class Spotify:
-    def __init__(self, BASE_64_STRING, CLIENT_ID, REDIRECT_URI, SCOPES, JSON_FILE_FOLDER="") -> None:
-        """BASE_64_STRING - Base 64 String of --> clientid:clientsecret\n
+    def __init__(self, BASE_64_STRING, CLIENT_ID, REDIRECT_URI, SCOPES, JSON_FILE_FOLDER="", API_URL="https://api.spotify.com", ACCOUNTS_URL="https://accounts.spotify.com", session=None, cache=None, scheduler=None, REFRESH_TOKEN=None, onRefreshToken=None, PKCE=False, authMode="prompt", metrics=None) -> None:
+        """BASE_64_STRING - Base 64 String of --> clientid:clientsecret (not needed with PKCE)\n
         CLIENT_ID - Users client ID from --> https://developer.spotify.com/dashboard\n
         REDIRECT_URI - Found on Spotify Developer Dashboard\n
         SCOPES -> Required scopes for the application to function\n
-        JSON_FILE_FOLDER -> Possible subfolder for JSON file"""
+        JSON_FILE_FOLDER -> Possible subfolder for JSON file\n
+        API_URL, ACCOUNTS_URL -> Base URLs of the Spotify Web API and Accounts service\n
+        session -> HTTPSession shared by every request, a pooled keep-alive session is created if not given\n
+        cache -> ResponseCache for read endpoints, an in-memory cache is created if not given, False disables caching\n
+        scheduler -> RequestScheduler throttling and retrying every API request, may be shared between Spotify objects\n
+        REFRESH_TOKEN -> Refresh token of the account. When given the Credentials file is not read, and the access token is fetched on the first request\n
+        onRefreshToken -> Called with every new refresh token the API issues, e.g. to persist it\n
+        PKCE -> Authorize with the PKCE flow, which needs no client secret\n
+        authMode -> How the first authorization is obtained when there is no refresh token:\n
+        * "prompt" - Print getKeyUrl() and wait for the code to be pasted (blocks construction)
+        * "callback" - Print getKeyUrl() and capture the redirect on a loopback server (REDIRECT_URI such as http://127.0.0.1:8888/callback) in the background
+        * "manual" - Do nothing, call authorize(code) once the code is known\n
+        metrics -> Receives a record of every request, cache lookup and token refresh (see Metrics), nothing is recorded if not given\n
+        When a refresh token exists, or authMode is "callback" or "manual", construction does not wait for the network: the access token is fetched on the first request. See waitForAuthorization."""
         self.BASE_64_STRING = BASE_64_STRING 
         self.CLIENT_ID = CLIENT_ID  
         self.REDIRECT_URI = REDIRECT_URI  
         self.JSON_FILE_FOLDER = JSON_FILE_FOLDER 
         self.SCOPES = SCOPES 
+        self.API_URL = API_URL
+        self.ACCOUNTS_URL = ACCOUNTS_URL
+        self.session = session if session is not None else HTTPSession()
+        self.cache = ResponseCache() if cache is None else cache or None
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.onRefreshToken = onRefreshToken
+        self.metrics = metrics if metrics is not None else NullMetrics()
+        self.credentials = None # CredentialFile, when the refresh token is kept in the Credentials file
+        self.PKCE = PKCE
+        self.authorized = threading.Event() # Set once a refresh token is held
+        self.__state = secrets.token_urlsafe(16)
+        self.__codeVerifier, self.__codeChallenge = pkcePair() if PKCE else (None, None)
+        self.__callback = None
         
-        self.accessToken = ""
+        self.tokens = TokenManager(self.__refreshAccessToken)
+        if REFRESH_TOKEN is not None:
+            self.refreshToken = REFRESH_TOKEN
+            self.authorized.set()
+            return
+
+        self.credentials = CredentialFile(f"{JSON_FILE_FOLDER}credentials.json")
+
         data = self.__retrieveCredFile()
         try:
             self.refreshToken = data["REFRESHKEY"]
         except KeyError:
             self.refreshToken = ""
 
-        if self.refreshToken == "":
+        if self.refreshToken != "":
+            self.authorized.set()
+        elif authMode == "prompt":
             print(self.getKeyUrl())
             authKey = input()
-            
-            self.__getAuthorizationTokens(authKey)
-            data["REFRESHKEY"] = self.refreshToken
-            self.__saveCredFile(data)
-        
-        else:
-            self.__refreshAccessToken()
+            self.authorize(authKey)
+        elif authMode == "callback":
+            self.__startCallback()
+
+    @property
+    def accessToken(self) -> str:
+        """The current access token, as held by the token manager."""
+        return self.tokens.accessToken
 
     def getKeyUrl(self) -> str:
         """Returns a URL which the user must go to to get their initial Authorization Token.\n
         Code is stated after ?code="""
-        return f"https://accounts.spotify.com/authorize?client_id={self.CLIENT_ID}&scope={self.SCOPES}&response_type=code&redirect_uri={self.REDIRECT_URI}" 
-
-    def __getAuthorizationTokens(self, token) -> None: 
-        """Gets initial refresh and access token, using the intial authorization token."""
-        authHeader = {}
-        authHeader["Authorization"] = "Basic " + self.BASE_64_STRING
-
-        url = "https://accounts.spotify.com/api/token"
-        form = {
-            "code":token,
-            "redirect_uri":self.REDIRECT_URI,
-            "grant_type":"authorization_code"
-        }
-        headers = {
-            "Authorization":"Basic " + self.BASE_64_STRING,
-            "Content-Type":"application/x-www-form-urlencoded"
-        }
-        form = urlencoding.urlencode(form) # type: ignore
-
-        # Get Spotify Response
-        response = requests.post(url=url, headers=headers, data=form).json()
-        
+        return authorizeUrl(self.ACCOUNTS_URL, self.CLIENT_ID, self.SCOPES, self.REDIRECT_URI, self.__state, self.__codeChallenge)
+
+    def __startCallback(self) -> None:
+        from CallbackServer import CallbackServer # Imports http.server, only needed here
+        self.__callback = CallbackServer(self.REDIRECT_URI, self.__state).start()
+        print(self.getKeyUrl())
+        threading.Thread(target=self.__awaitCallback, daemon=True).start()
+
+    def __awaitCallback(self) -> None:
         try:
-            self.refreshToken = response["refresh_token"]
-            self.accessToken = response["access_token"]
-            self.accessTokenExpiry = [datetime.now().strftime("%d/%m/%Y %H:%M:%S"),int(response["expires_in"])]
-        except KeyError:
+            self.authorize(self.__callback.wait())
+        except AuthorizationError as error:
+            print("AuthorizationFailed", error)
+        finally:
+            self.__callback.stop()
+            self.__callback = None
+
+    def waitForAuthorization(self, timeout=None) -> bool:
+        """Waits until a refresh token is held (e.g. while authMode="callback" waits for the user), returns False on timeout."""
+        return self.authorized.wait(timeout)
+
+    def __tokenRequest(self, form) -> dict:
+        """Posts a form to the token endpoint, authenticating with the client secret or, with PKCE, the client ID."""
+        headers, body = tokenRequest(form, self.BASE_64_STRING, self.CLIENT_ID if self.PKCE else None)
+        return self.session.post(tokenUrl(self.ACCOUNTS_URL), headers=headers, data=body).json()
+
+    def authorize(self, token) -> bool:
+        """Gets initial refresh and access token, using the intial authorization token, and saves the refresh token.\n
+        Returns False if the authorization token was rejected."""
+        response = self.__tokenRequest(authorizationCodeForm(token, self.REDIRECT_URI, self.__codeVerifier))
+        accessToken, expiresIn, refreshToken = tokenResult(response)
+        if accessToken is None or refreshToken is None:
             print(response)
+            return False
+        self.__setRefreshToken(refreshToken)
+        self.tokens.set(accessToken, expiresIn)
+        if self.credentials is not None:
+            self.__saveCredFile({"REFRESHKEY": self.refreshToken})
+        self.authorized.set()
+        return True
+
+    def __setRefreshToken(self, refreshToken) -> None:
+        if refreshToken != self.refreshToken:
+            self.refreshToken = refreshToken
+            if self.onRefreshToken is not None:
+                self.onRefreshToken(refreshToken)
+            elif self.credentials is not None: # Rotated tokens are persisted, the old one may already be revoked
+                self.credentials.update(lambda data: {**data, "REFRESHKEY": refreshToken})
 
     # Refreshes an Access token when needed.
-    def __refreshAccessToken(self) -> None:
-        """Refreshes the Access token using the Refresh Token when it expires."""
-        url = "https://accounts.spotify.com/api/token"
-        form = {
-            "grant_type": "refresh_token",
-            "refresh_token":self.refreshToken
-        }
-        headers = {
-            "Authorization":"Basic " + self.BASE_64_STRING,
-            "Content-Type":"application/x-www-form-urlencoded"
-        }
-
-        # Get Spotify response
-        response = requests.post(url=url, headers=headers, data=urlencoding.urlencode(query=form)).json() # type: ignore
-        try:
-            self.accessToken = response["access_token"]
-            self.accessTokenExpiry = [datetime.now().strftime("%d/%m/%Y %H:%M:%S"),int(response["expires_in"])]
-        except KeyError:
+    def __refreshAccessToken(self) -> tuple:
+        """Refreshes the Access token using the Refresh Token when it expires.\n
+        Called by the token manager, returns (accessToken, expiresIn) or None on failure."""
+        if self.refreshToken == "": # Not authorized yet
+            return None
+        accessToken, expiresIn, refreshToken = tokenResult(self.__tokenRequest(refreshTokenForm(self.refreshToken)))
+        if refreshToken is not None: # The API does not always respond with a refresh token
+            self.__setRefreshToken(refreshToken)
+
+        result = None
+        if accessToken is not None:
+            result = accessToken, expiresIn
+        else:
             print("InvalidRefreshToken", self.refreshToken)
-            
-        try: # Needed because the API does not always respond with a refresh token
-            self.refreshToken = response["refresh_token"]
-        except KeyError:
-            pass
+        self.metrics.tokenRefresh(result is not None)
+        return result
     
-    def get(self, url) -> dict:
-        """Handles token expiry and no content automatically when making an HTTP GET request."""
-        headers = {"Authorization": f"Bearer {self.accessToken}"}
-        response = requests.get(url, headers=headers)
+    def __send(self, method, url, data="", headers=None, priority=PRIORITY_DEFAULT):
+        """Sends an HTTP request with a valid access token and returns the response.\n
+        Tokens are refreshed ahead of expiry, if the API still responds 401 the token is refreshed and the original request is retried once."""
+        headers = dict(headers or {})
+        token = self.tokens.get()
+        headers["Authorization"] = f"Bearer {token}"
+        attempts = [0]
+
+        def send():
+            attempts[0] += 1
+            return self.session.request(method, url, headers=headers, data=data)
+
+        start = time.perf_counter() if self.metrics.enabled else 0.0
+        response = self.scheduler.execute(send, priority, method in IDEMPOTENT_METHODS)
         if response.status_code == 401:
-            print("Token Expired")
-            self.__refreshAccessToken()
-            return self.requestPlayback(), response.status_code
-        elif response.status_code == 204:
-            return json.dumps({"Playback":"No Content"}), response.status_code
-        elif response.status_code == 200:
-            return response.json(), response.status_code
+            token = self.tokens.refresh(token)
+            headers["Authorization"] = f"Bearer {token}"
+            response = self.scheduler.execute(send, priority, method in IDEMPOTENT_METHODS)
+        if self.metrics.enabled:
+            self.metrics.request(method, endpointName(url), response.status_code, time.perf_counter() - start, len(data or ""), len(response.content), attempts[0] - 1)
+        return response
+
+    def __request(self, method, url, data="", priority=PRIORITY_DEFAULT) -> dict:
+        response = self.__send(method, url, data, priority=priority)
+        return responseResult(response.status_code, response.content)
+
+    def get(self, url, priority=PRIORITY_DEFAULT, revalidate=False) -> dict:
+        """Handles token expiry and no content automatically when making an HTTP GET request.\n
+        Read endpoints are answered from the cache while fresh, and revalidated with their ETag once stale.\n
+        revalidate -> Ask the API even if the cached response is fresh, for reads which must see the latest state"""
+        if self.cache is None or self.cache.ttlFor(url) is None:
+            return self.__request("GET", url, priority=priority)
+
+        result, entry, headers = cacheLookup(self.cache, self.metrics, url, revalidate)
+        if result is not None:
+            return result
+        response = self.__send("GET", url, headers=headers, priority=priority)
+        return cacheResult(self.cache, self.metrics, url, entry, response.status_code, response.content, response.headers.get("ETag"))
         
-    def post(self, url, data="") -> dict:
+    def post(self, url, data="", priority=PRIORITY_DEFAULT) -> dict:
         """Handles token expiry and no content automatically when making an HTTP POST request."""
-        headers = {"Authorization": f"Bearer {self.accessToken}"}
-        response = requests.post(url, headers=headers, data=data)
-        if response.status_code == 401:
-            print("Token Expired")
-            self.__refreshAccessToken()
-            return self.requestPlayback(), response.status_code
-        elif response.status_code == 204:
-            return json.dumps({"Playback":"No Content"}), response.status_code
-        elif response.status_code == 200:
-            return response.json(), response.status_code
+        return self.__request("POST", url, data, priority)
         
     def requestPlayback(self) -> json:
         """Returns the users currently playing song as a json object."""
-        return self.get('https://api.spotify.com/v1/me/player')
+        return self.get(playbackUrl(self.API_URL), PRIORITY_BACKGROUND)
         
-    def requestFormattedPlayback(self) -> dict:
-        """Retrieves the users currently playing song, formats it into the necessary data and outputs it as a dictionary."""
+    def requestPlaybackSnapshot(self) -> TrackSnapshot:
+        """Retrieves the users currently playing song as a TrackSnapshot, falling back to the playlist image when the track has no album art."""
         data, statusCode = self.requestPlayback()
         
         # If there is no content, there is nothing to format!
         if statusCode == 204:
             return data, statusCode
         
-        try:
-            trackID = data['item']['id']
-        except KeyError:
-            trackID = None
-        try:
-            trackName = data['item']['name']
-        except KeyError:
-            trackName = None
-        try:
-            names = []
-            for i in range(0, len(data['item']['artists'])):
-                names.append(data['item']['artists'][i]["name"])
-            trackArtists = ", ".join(names)
-        except KeyError:
-            trackArtists = None
-        try:
-            link = data['item']['external_urls']['spotify']
-        except:
-            link = None
-        try:
-            try:
-                lqAlbumArt = data["item"]["album"]["images"][2]["url"]
-            except KeyError:
-                lqAlbumArt = None
-            try:
-                hqAlbumArt = data["item"]["album"]["images"][0]["url"]
-            except KeyError:
-                hqAlbumArt = None
-        except IndexError:
-            lqAlbumArt = None
-            hqAlbumArt = None
-            
-        if lqAlbumArt == None:
-            try:
-                lqAlbumArt, statusCode = self.getPlaylistImage(str(data["context"]["external_urls"]["spotify"]).replace("https://open.spotify.com/playlist/","",1))
-                lqAlbumArt = lqAlbumArt[0]["url"]
-            except KeyError:
-                pass
-            except IndexError:
-                pass
-        try:
-            playing = data["is_playing"]
-        except KeyError:
-            playing = False
-
-        trackData = {
-            "id":trackID,
-            "name":trackName,
-            "artists":trackArtists,
-            "link":link,
-            "hq_art":hqAlbumArt,
-            "art":lqAlbumArt,
-            "playing":playing
-        }
+        snapshot = extractSnapshot(data)
+        playlist = needsPlaylistArt(snapshot, contextUrl(data))
+        if playlist is not None:
+            setPlaylistArt(snapshot, self.getPlaylistImage(playlist)[0])
+        return snapshot, statusCode
 
-        return trackData, statusCode
+    def requestFormattedPlayback(self) -> dict:
+        """Retrieves the users currently playing song, formats it into the necessary data and outputs it as a dictionary."""
+        snapshot, statusCode = self.requestPlaybackSnapshot()
+        if statusCode == 204:
+            return snapshot, statusCode
+        return snapshot.asDict(), statusCode
 
     def __retrieveCredFile(self) -> dict:
         """Retrieves refresh token from Credentials file."""
-        with open(f"{self.JSON_FILE_FOLDER}credentials.json","r") as f:
-            data = json.load(f)
-        return data
+        return self.credentials.read()
 
     def __saveCredFile(self, data) -> None:
-        """Saves refresh token to the Credentials file."""
-        with open(f"{self.JSON_FILE_FOLDER}credentials.json", "w") as f:
-            json.dump(data, f)
+        """Saves refresh token to the Credentials file, atomically and at once."""
+        self.credentials.update(lambda current: {**current, **data})
+        self.credentials.flush()
 
-    def search(self, query, searchType) -> dict:
+    def search(self, query, searchType, limit=None) -> dict:
         """Searches for a song on the Spoify Database\n
         Common valid search types include:
         * "track"
         * "album"
-        * "artist" """
-        url = "https://api.spotify.com/v1/search"
-        searchQuery = f"?q={query}&type={searchType}"
-        return self.get(f"{url}{searchQuery}")
+        * "artist"\n
+        limit -> Maximum number of results, the API defaults to 20"""
+        return self.get(searchUrl(self.API_URL, query, searchType, limit))
     
     def searchAndQueue(self, query) -> json:
         """Searches and Queues a song on the users spotify account."""
-        response = self.search(query, "track")
+        response, statusCode = self.search(query, "track", limit=1)
         newTrack = response["tracks"]["items"][0]["uri"]
         return self.addToQueue(newTrack)
     
     def addToQueue(self, uri) -> json:
         """Adds a track to queue, using the tracks unique identifier."""
-        url = "https://api.spotify.com/v1/me/player/queue"
-        track = f"?uri={uri}"
-        return self.post(f"{url}{track}")
+        return self.post(addToQueueUrl(self.API_URL, uri), priority=PRIORITY_USER)
     
+    def getQueue(self) -> dict:
+        """Gets the currently playing track and the tracks in the users queue."""
+        return self.get(queueUrl(self.API_URL))
+
+    def queueBatch(self, items, concurrency=8, dedupe=True) -> list:
+        """Queues many tracks, given as URIs (spotify:track:...) and/or search queries, in the given order.\n
+        Searches run concurrently (at most concurrency at once), then tracks are added to the queue one by one.\n
+        dedupe -> Skip tracks already playing, already in the queue or earlier in items\n
+        Returns one dictionary per item: {"item", "uri", "status", "statusCode"}, status being "queued", "duplicate", "not_found" or "failed"."""
+        from concurrent.futures import ThreadPoolExecutor
+        results = batchResults(items)
+        searches = [result for result in results if result["uri"] is None]
+        queue = set()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            current = executor.submit(self.getQueue) if dedupe else None
+            responses = executor.map(lambda result: self.search(result["item"], "track", limit=1), searches)
+            for result, (response, statusCode) in zip(searches, responses):
+                result["uri"] = firstTrackURI(response)
+                result["statusCode"] = statusCode
+            if current is not None:
+                queue = queueURIs(current.result()[0])
+
+        for result in results:
+            if not batchStatus(result, queue, dedupe):
+                continue
+            response, result["statusCode"] = self.addToQueue(result["uri"])
+            result["status"] = "queued" if result["statusCode"] in (200, 204) else "failed"
+            queue.add(result["uri"])
+        return results
+
     def skip(self, forward=True) -> json:
         """Skips the currently playing song in the users queue."""
-        url_fw = "https://api.spotify.com/v1/me/player/next"
-        url_bw = "https://api.spotify.com/v1/me/player/previous"
-        if forward:
-            return self.post(url_fw)
-        else:
-            return self.post(url_bw)
+        return self.post(skipUrl(self.API_URL, forward), priority=PRIORITY_USER)
     
+    def getPlaylist(self, playlistID, fields=None, revalidate=False) -> dict:
+        """Gets a playlists details, e.g. fields="snapshot_id,name" to only check whether it changed (with revalidate, see get)."""
+        return self.get(playlistUrl(self.API_URL, playlistID, fields), revalidate=revalidate)
+
     def getPlaylistItems(self, playlistID) -> dict:
-        """Gets the whole contents of a users playlist."""
-        url = f"https://api.spotify.com/v1/playlists/{playlistID}/tracks"
-        return self.get(url)
+        """Gets the first page (up to 100 items) of a users playlist, use iterPlaylistItems for the whole contents."""
+        return self.get(playlistItemsUrl(self.API_URL, playlistID))
+
+    def iterPlaylistItems(self, playlistID, fields=PLAYLIST_TRACK_FIELDS, limit=100, prefetch=0, skipMissing=True):
+        """Lazily yields every track of a playlist as PlaylistTrack records, one page at a time.\n
+        fields -> Projection sent to the API to shrink each page, must keep next, total and the track fields used by PlaylistTrack\n
+        limit -> Items per page (maximum 100)\n
+        prefetch -> Number of pages fetched concurrently ahead of the one being consumed, 0 follows next links sequentially\n
+        skipMissing -> False yields items without a track as records whose fields are all None, see playlistTracks\n
+        Pages are not cached, so memory use stays bounded however long the playlist is."""
+        url = f"{playlistItemsUrl(self.API_URL, playlistID)}?fields={fields}&limit={limit}"
+        page, statusCode = self.__request("GET", f"{url}&offset=0")
+        if statusCode != 200:
+            return
+
+        if prefetch <= 0:
+            position = 0
+            while True:
+                tracks = playlistTracks(page, position, skipMissing)
+                position += len(page.get("items", []))
+                nextUrl = page.get("next")
+                page = None # Only one page is held while the caller consumes it
+                yield from tracks
+                if not nextUrl:
+                    return
+                page, statusCode = self.__request("GET", nextUrl)
+                if statusCode != 200:
+                    return
+
+        # The total is known from the first page, so later pages are requested by offset without waiting for each next link
+        from concurrent.futures import ThreadPoolExecutor
+        offsets = iter(range(limit, page.get("total", 0), limit))
+        executor = ThreadPoolExecutor(max_workers=prefetch)
+        pending = []
+        try:
+            for offset in offsets:
+                pending.append((offset, executor.submit(self.__request, "GET", f"{url}&offset={offset}")))
+                if len(pending) >= prefetch:
+                    break
+            tracks = playlistTracks(page, 0, skipMissing)
+            page = None
+            yield from tracks
+
+            while pending:
+                offset, future = pending.pop(0)
+                for nextOffset in offsets:
+                    pending.append((nextOffset, executor.submit(self.__request, "GET", f"{url}&offset={nextOffset}")))
+                    break
+                page, statusCode = future.result()
+                if statusCode != 200:
+                    return
+                tracks = playlistTracks(page, offset, skipMissing)
+                page = None
+                yield from tracks
+        finally:
+            for offset, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
 
     def getPlaylistImage(self, playlistID) -> str:
         """Gets the image of the currently playing playlist"""
-        url = f"https://api.spotify.com/v1/playlists/{playlistID}/images"
-        return self.get(url)
+        return self.get(playlistImageUrl(self.API_URL, playlistID))
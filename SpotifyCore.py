@@ -0,0 +1,260 @@
+"""Transport-agnostic core shared by Spotify, AsyncSpotify and uSpotify: endpoint URLs, token requests, response parsing and caching,\n
+playlist and queue records. Imports nothing but URLEncoding and namedtuple, so it runs on MicroPython and costs next to nothing to import on CPython.\n
+Spotify (requests), AsyncSpotify (httpx) and uSpotify (urequests) only add the transport."""
+from collections import namedtuple
+
+# Other Programs
+from URLEncoding import urlencoding
+
+TOKEN_MARGIN = 60 # Seconds before expiry at which the access token is refreshed
+
+# Data returned for 204 responses, the output of json.dumps({"Playback":"No Content"})
+NO_CONTENT = '{"Playback": "No Content"}'
+
+PLAYLIST_URL = "https://open.spotify.com/playlist/"
+
+# Path of the context URL in /v1/me/player, for streaming extraction alongside TrackSnapshot.PLAYBACK_PATHS
+CONTEXT_PATH = ("context", "external_urls", "spotify")
+
+# Compact record yielded when iterating over a playlist
+PlaylistTrack = namedtuple("PlaylistTrack", ["position", "id", "uri", "name", "artists"])
+
+# Only request the parts of each playlist page needed to build PlaylistTrack records
+PLAYLIST_TRACK_FIELDS = "items(track(id,uri,name,artists(name))),next,total"
+
+parser = None # JSON parser, chosen on the first call of loads
+
+# Endpoints
+def authorizeUrl(ACCOUNTS_URL, CLIENT_ID, SCOPES, REDIRECT_URI, state=None, codeChallenge=None) -> str:
+    """Returns the URL the user visits to authorize the application, with every parameter URL encoded.\n
+    codeChallenge -> PKCE challenge from Authorization.pkcePair(), the client secret is then not needed"""
+    query = {
+        "client_id":CLIENT_ID,
+        "response_type":"code",
+        "redirect_uri":REDIRECT_URI,
+        "scope":SCOPES
+    }
+    if state is not None:
+        query["state"] = state
+    if codeChallenge is not None:
+        query["code_challenge_method"] = "S256"
+        query["code_challenge"] = codeChallenge
+    return f"{ACCOUNTS_URL}/authorize?{urlencoding.urlencode(query)}"
+
+def tokenUrl(ACCOUNTS_URL) -> str:
+    return f"{ACCOUNTS_URL}/api/token"
+
+def playbackUrl(API_URL, market=None) -> str:
+    """market -> e.g. "from_token", the API then leaves out the available_markets lists, shrinking the response"""
+    if market is None:
+        return f"{API_URL}/v1/me/player"
+    return f"{API_URL}/v1/me/player?market={market}"
+
+def searchUrl(API_URL, query, searchType, limit=None) -> str:
+    url = f"{API_URL}/v1/search?q={urlencoding.quote(query)}&type={searchType}"
+    if limit is not None:
+        url += f"&limit={limit}"
+    return url
+
+def addToQueueUrl(API_URL, uri) -> str:
+    return f"{API_URL}/v1/me/player/queue?uri={urlencoding.quote(uri)}"
+
+def queueUrl(API_URL) -> str:
+    return f"{API_URL}/v1/me/player/queue"
+
+def skipUrl(API_URL, forward=True) -> str:
+    if forward:
+        return f"{API_URL}/v1/me/player/next"
+    return f"{API_URL}/v1/me/player/previous"
+
+def playlistUrl(API_URL, playlistID, fields=None) -> str:
+    url = f"{API_URL}/v1/playlists/{playlistID}"
+    if fields is not None:
+        url += f"?fields={urlencoding.quote(fields)}"
+    return url
+
+def playlistItemsUrl(API_URL, playlistID) -> str:
+    return f"{API_URL}/v1/playlists/{playlistID}/tracks"
+
+def playlistImageUrl(API_URL, playlistID) -> str:
+    return f"{API_URL}/v1/playlists/{playlistID}/images"
+
+# Tokens
+def authorizationCodeForm(code, REDIRECT_URI, codeVerifier=None) -> dict:
+    """Form exchanging the code from the authorize redirect for the first tokens."""
+    form = {
+        "code":code,
+        "redirect_uri":REDIRECT_URI,
+        "grant_type":"authorization_code"
+    }
+    if codeVerifier is not None:
+        form["code_verifier"] = codeVerifier
+    return form
+
+def refreshTokenForm(refreshToken) -> dict:
+    return {
+        "grant_type": "refresh_token",
+        "refresh_token":refreshToken
+    }
+
+def tokenRequest(form, BASE_64_STRING=None, CLIENT_ID=None) -> tuple:
+    """Returns (headers, body) posting a form to the token endpoint, authenticating with the client secret,\n
+    or with PKCE (CLIENT_ID given) the client ID."""
+    headers = {"Content-Type":"application/x-www-form-urlencoded"}
+    if CLIENT_ID is not None:
+        form["client_id"] = CLIENT_ID
+    else:
+        headers["Authorization"] = "Basic " + BASE_64_STRING
+    return headers, urlencoding.urlencode(form)
+
+def tokenResult(response) -> tuple:
+    """Reads a token endpoint response into (accessToken, expiresIn, refreshToken).\n
+    accessToken is None if the request was rejected, refreshToken is None when the API did not issue a new one."""
+    if not isinstance(response, dict):
+        return None, None, None
+    refreshToken = response.get("refresh_token")
+    if "access_token" not in response or "expires_in" not in response:
+        return None, None, refreshToken
+    return response["access_token"], int(response["expires_in"]), refreshToken
+
+# Responses
+def loads(data):
+    """Parses a response body with orjson when it is installed (several times faster than json), imported on first use."""
+    global parser
+    if parser is None:
+        try:
+            from orjson import loads as parser
+        except ImportError:
+            from json import loads as parser
+    return parser(data)
+
+def errorResponse(statusCode, message=None) -> dict:
+    """Spotify's error object, returned for error responses without a JSON body so callers can still unpack them."""
+    error = {"status": statusCode}
+    if message is not None:
+        error["message"] = message
+    return {"error": error}
+
+def responseResult(statusCode, content) -> tuple:
+    """Converts the status and body of a response into (data, statusCode).\n
+    Errors (e.g. 429 after every retry) are returned with Spotify's error object rather than None, so callers can still unpack them."""
+    if statusCode == 204:
+        return NO_CONTENT, statusCode
+    elif statusCode == 200:
+        return loads(content), statusCode
+    try:
+        return loads(content), statusCode
+    except ValueError:
+        try:
+            message = content.decode() if content else None
+        except UnicodeError:
+            message = None
+        return errorResponse(statusCode, message), statusCode
+
+def cacheLookup(cache, metrics, url, revalidate=False) -> tuple:
+    """First half of a GET through a ResponseCache, returns (result, entry, headers).\n
+    result is the cached (data, statusCode) when it can be used without a request, otherwise None,\n
+    and the request is to be sent with headers, which hold the ETag of the stale entry to revalidate it with."""
+    entry, fresh = cache.lookup(url)
+    if fresh and not revalidate:
+        if metrics.enabled:
+            from Metrics import endpointName
+            metrics.cache(endpointName(url), "hit")
+        return (entry["data"], entry["status"]), entry, None
+    headers = {}
+    if entry is not None and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    return None, entry, headers
+
+def cacheResult(cache, metrics, url, entry, statusCode, content, etag=None) -> tuple:
+    """Second half of a GET through a ResponseCache: returns (data, statusCode) for the response to the request cacheLookup asked for,\n
+    extending the entry on 304 Not Modified and storing 200 responses."""
+    revalidated = statusCode == 304 and entry is not None
+    if metrics.enabled:
+        from Metrics import endpointName
+        metrics.cache(endpointName(url), "revalidated" if revalidated else "miss")
+    if revalidated:
+        cache.revalidated(url, entry)
+        return entry["data"], entry["status"]
+    result = responseResult(statusCode, content)
+    if statusCode == 200:
+        cache.store(url, result[0], statusCode, etag)
+    return result
+
+def contextUrl(data) -> str:
+    """Returns the URL of the context (playlist, album...) a /v1/me/player response is playing from, None if there is none."""
+    try:
+        return data["context"]["external_urls"]["spotify"]
+    except (KeyError, TypeError):
+        return None
+
+def playlistIDFromUrl(url) -> str:
+    """Returns the ID of the playlist a context URL points at, None for any other context."""
+    if url is None or not str(url).startswith(PLAYLIST_URL):
+        return None
+    return str(url)[len(PLAYLIST_URL):]
+
+def needsPlaylistArt(snapshot, url) -> str:
+    """Returns the ID of the playlist whose image stands in for the art of a snapshot without album art (e.g. a local file),\n
+    None if the snapshot has art or is not played from a playlist. Fetch the images and pass them to setPlaylistArt.\n
+    url -> Context URL of the playback, see contextUrl"""
+    if snapshot.art is not None:
+        return None
+    return playlistIDFromUrl(url)
+
+def setPlaylistArt(snapshot, images) -> None:
+    """Sets the art of a snapshot to the first of the images returned by getPlaylistImage, leaving it as it was if there are none."""
+    try:
+        snapshot.art = images[0]["url"]
+    except (KeyError, IndexError, TypeError):
+        pass
+
+# Playlists and queue
+def playlistTracks(page, position, skipMissing=True) -> list:
+    """Builds PlaylistTrack records for a page of /v1/playlists/{id}/tracks, numbering them from position.\n
+    Items without a track (e.g. unavailable local files) are skipped but still take up a position,\n
+    unless skipMissing is False, in which case they are returned as records whose fields are all None."""
+    tracks = []
+    for item in page.get("items", []):
+        track = item.get("track")
+        if track:
+            artists = ", ".join([artist["name"] for artist in track.get("artists", [])])
+            tracks.append(PlaylistTrack(position, track.get("id"), track.get("uri"), track.get("name"), artists))
+        elif not skipMissing:
+            tracks.append(PlaylistTrack(position, None, None, None, None))
+        position += 1
+    return tracks
+
+def isURI(item) -> bool:
+    """True for Spotify URIs (spotify:track:...), False for search queries."""
+    return item.startswith("spotify:")
+
+def firstTrackURI(response) -> str:
+    """Returns the URI of the first track of a search response, or None if nothing was found."""
+    try:
+        return response["tracks"]["items"][0]["uri"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+def queueURIs(response) -> set:
+    """Returns the URIs of the currently playing track and every track of a /v1/me/player/queue response."""
+    uris = set()
+    if isinstance(response, dict):
+        for track in [response.get("currently_playing")] + (response.get("queue") or []):
+            if track:
+                uris.add(track.get("uri"))
+    return uris
+
+def batchResults(items) -> list:
+    """Creates the per-item results of a queueBatch, see Spotify.queueBatch."""
+    return [{"item":item, "uri":item if isURI(item) else None, "status":None, "statusCode":None} for item in items]
+
+def batchStatus(result, queue, dedupe) -> bool:
+    """Sets the status of a result which cannot be queued and returns False, or returns True if it should be queued."""
+    if result["uri"] is None:
+        result["status"] = "not_found" if result["statusCode"] == 200 else "failed"
+        return False
+    if dedupe and result["uri"] in queue:
+        result["status"] = "duplicate"
+        return False
+    return True
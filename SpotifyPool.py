@@ -0,0 +1,134 @@
+"""Serves many Spotify accounts from one process, sharing a connection pool, rate limiter and response cache."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Other Programs
+from Spotify import Spotify
+from HTTPSession import HTTPSession
+from ResponseCache import ResponseCache
+from RequestScheduler import RequestScheduler
+
+class SpotifyPool:
+    def __init__(self, BASE_64_STRING, CLIENT_ID, REDIRECT_URI, SCOPES, store, API_URL="https://api.spotify.com", ACCOUNTS_URL="https://accounts.spotify.com", session=None, cache=None, scheduler=None, concurrency=16, backgroundRefresh=False, metrics=None) -> None:
+        """BASE_64_STRING, CLIENT_ID, REDIRECT_URI, SCOPES -> Spotify application shared by every account, see Spotify\n
+        store -> Credential store holding the refresh token of every account (see CredentialStore), rotated tokens are saved back to it\n
+        API_URL, ACCOUNTS_URL -> Base URLs of the Spotify Web API and Accounts service\n
+        session, cache, scheduler -> Shared by every account, created if not given (False disables the cache). Each account reads and writes its own namespace of the cache\n
+        concurrency -> Connections kept open by the default session, and accounts polled at once by map\n
+        backgroundRefresh -> Refresh access tokens ahead of expiry on timer threads (one per account), otherwise they are refreshed on the first request once stale\n
+        metrics -> Shared by every account, see Metrics\n
+        Accounts are only loaded from the store here, a Spotify object is created and its token refreshed on first use."""
+        self.BASE_64_STRING = BASE_64_STRING
+        self.CLIENT_ID = CLIENT_ID
+        self.REDIRECT_URI = REDIRECT_URI
+        self.SCOPES = SCOPES
+        self.API_URL = API_URL
+        self.ACCOUNTS_URL = ACCOUNTS_URL
+        self.store = store
+        self.session = session if session is not None else HTTPSession(poolSize=concurrency)
+        self.cache = ResponseCache() if cache is None else cache or None
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.concurrency = concurrency
+        self.backgroundRefresh = backgroundRefresh
+        self.metrics = metrics
+
+        self.__tokens = store.load()
+        self.__clients = {}
+        self.__lock = threading.Lock()
+
+    def accounts(self) -> list:
+        """Names of every account in the pool."""
+        return list(self.__tokens)
+
+    def reload(self) -> None:
+        """Reads the accounts from the store again, e.g. after another process added one."""
+        tokens = self.store.load()
+        with self.__lock:
+            self.__tokens = tokens
+            for account in [account for account in self.__clients if account not in tokens]:
+                self.__clients.pop(account).tokens.stop()
+
+    def get(self, account) -> Spotify:
+        """Returns the Spotify object of an account, creating it on first use. Raises KeyError for unknown accounts."""
+        client = self.__clients.get(account)
+        if client is not None:
+            return client
+        with self.__lock:
+            client = self.__clients.get(account)
+            if client is None:
+                client = Spotify(
+                    self.BASE_64_STRING, self.CLIENT_ID, self.REDIRECT_URI, self.SCOPES,
+                    API_URL=self.API_URL, ACCOUNTS_URL=self.ACCOUNTS_URL,
+                    session=self.session, cache=self.cache.namespaced(account) if self.cache is not None else False, scheduler=self.scheduler,
+                    REFRESH_TOKEN=self.__tokens[account],
+                    onRefreshToken=lambda refreshToken: self.__rotated(account, refreshToken),
+                    metrics=self.metrics
+                )
+                client.tokens.background = self.backgroundRefresh
+                self.__clients[account] = client
+            return client
+
+    def __rotated(self, account, refreshToken) -> None:
+        self.__tokens[account] = refreshToken
+        self.store.save(account, refreshToken)
+
+    def add(self, account, refreshToken) -> Spotify:
+        """Adds (or replaces) an account and saves it to the store."""
+        self.store.save(account, refreshToken)
+        with self.__lock:
+            self.__tokens[account] = refreshToken
+            client = self.__clients.pop(account, None)
+        if client is not None:
+            client.tokens.stop()
+        return self.get(account)
+
+    def remove(self, account) -> None:
+        """Removes an account from the pool and the store."""
+        self.store.delete(account)
+        with self.__lock:
+            self.__tokens.pop(account, None)
+            client = self.__clients.pop(account, None)
+        if client is not None:
+            client.tokens.stop()
+
+    def map(self, function, accounts=None) -> dict:
+        """Calls function(client) for many accounts (every account by default), at most concurrency at once.\n
+        Returns {account: result}, holding the exception raised instead for accounts which failed."""
+        accounts = self.accounts() if accounts is None else list(accounts)
+
+        def call(account):
+            try:
+                return function(self.get(account))
+            except Exception as error:
+                return error
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return dict(zip(accounts, executor.map(call, accounts)))
+
+    def pollAll(self, formatted=True, accounts=None) -> dict:
+        """Polls the playback of many accounts at once, returns {account: (data, statusCode)}."""
+        if formatted:
+            return self.map(lambda client: client.requestFormattedPlayback(), accounts)
+        return self.map(lambda client: client.requestPlayback(), accounts)
+
+    def close(self) -> None:
+        """Stops every background token refresh, writes any coalesced token updates and closes the shared session."""
+        with self.__lock:
+            for client in self.__clients.values():
+                client.tokens.stop()
+            self.__clients.clear()
+        if hasattr(self.store, "flush"):
+            self.store.flush()
+        self.session.close()
+
+    def __getitem__(self, account) -> Spotify:
+        return self.get(account)
+
+    def __contains__(self, account) -> bool:
+        return account in self.__tokens
+
+    def __len__(self) -> int:
+        return len(self.__tokens)
+
+    def __iter__(self):
+        return iter(self.accounts())
@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+
+# Other Programs
+from SpotifyCore import TOKEN_MARGIN
+
+class TokenManager:
+    def __init__(self, refreshFunction, margin=TOKEN_MARGIN, jitter=30, background=True) -> None:
+        """refreshFunction - Callable returning (accessToken, expiresIn), or None if the refresh failed\n
+        margin -> Seconds before expiry at which the token is considered stale\n
+        jitter -> Maximum random seconds subtracted from the background refresh time, so many clients don't refresh at once\n
+        background -> Refresh ahead of expiry on a daemon timer thread"""
+        self.refreshFunction = refreshFunction
+        self.margin = margin
+        self.jitter = jitter
+        self.background = background
+
+        self.accessToken = ""
+        self.deadline = 0.0 # time.monotonic() at which the access token expires
+        self.__lock = threading.Lock()
+        self.__timer = None
+
+    def set(self, accessToken, expiresIn) -> None:
+        """Stores a new access token valid for expiresIn seconds and schedules its background refresh."""
+        self.accessToken = accessToken
+        self.deadline = time.monotonic() + int(expiresIn)
+        self.__schedule()
+
+    def expiresIn(self) -> float:
+        """Seconds until the current access token expires."""
+        return self.deadline - time.monotonic()
+
+    def isStale(self) -> bool:
+        """True when the access token is missing or within the refresh margin of expiry."""
+        return self.accessToken == "" or self.expiresIn() <= self.margin
+
+    def get(self) -> str:
+        """Returns a valid access token, refreshing first if it is stale."""
+        token = self.accessToken
+        if self.isStale():
+            token = self.refresh(token)
+        return token
+
+    def refresh(self, staleToken=None) -> str:
+        """Refreshes the access token. Concurrent callers share a single refresh:\n
+        if staleToken is given and another thread has already replaced it, no new request is made."""
+        with self.__lock:
+            if staleToken is not None and self.accessToken != staleToken and not self.isStale():
+                return self.accessToken
+            result = self.refreshFunction()
+            if result is not None:
+                self.set(*result)
+            return self.accessToken
+
+    def stop(self) -> None:
+        """Cancels any pending background refresh."""
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+    def __schedule(self) -> None:
+        """Arms the background timer to refresh shortly before the margin is reached."""
+        self.stop()
+        if not self.background:
+            return
+        delay = self.expiresIn() - self.margin - random.uniform(0, self.jitter)
+        if delay <= 0:
+            return
+        self.__timer = threading.Timer(delay, self.__backgroundRefresh)
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    def __backgroundRefresh(self) -> None:
+        """Timer callback, refreshes unless a request already did so."""
+        self.__timer = None
+        staleToken = self.accessToken
+        with self.__lock:
+            if self.accessToken != staleToken:
+                return
+            result = self.refreshFunction()
+            if result is not None:
+                self.set(*result)
+
+class AsyncTokenManager:
+    def __init__(self, refreshFunction, margin=TOKEN_MARGIN, jitter=30, background=True) -> None:
+        """asyncio counterpart of TokenManager.\n
+        refreshFunction - Coroutine function returning (accessToken, expiresIn), or None if the refresh failed\n
+        margin -> Seconds before expiry at which the token is considered stale\n
+        jitter -> Maximum random seconds subtracted from the background refresh time\n
+        background -> Refresh ahead of expiry on the running event loop"""
+        import asyncio # Imported here so that TokenManager users do not pay for it
+        self.refreshFunction = refreshFunction
+        self.margin = margin
+        self.jitter = jitter
+        self.background = background
+
+        self.accessToken = ""
+        self.deadline = 0.0
+        self.__lock = asyncio.Lock()
+        self.__handle = None
+
+    def set(self, accessToken, expiresIn) -> None:
+        """Stores a new access token valid for expiresIn seconds and schedules its background refresh."""
+        self.accessToken = accessToken
+        self.deadline = time.monotonic() + int(expiresIn)
+        self.__schedule()
+
+    def expiresIn(self) -> float:
+        """Seconds until the current access token expires."""
+        return self.deadline - time.monotonic()
+
+    def isStale(self) -> bool:
+        """True when the access token is missing or within the refresh margin of expiry."""
+        return self.accessToken == "" or self.expiresIn() <= self.margin
+
+    async def get(self) -> str:
+        """Returns a valid access token, refreshing first if it is stale."""
+        token = self.accessToken
+        if self.isStale():
+            token = await self.refresh(token)
+        return token
+
+    async def refresh(self, staleToken=None) -> str:
+        """Refreshes the access token, concurrent callers await a single refresh."""
+        async with self.__lock:
+            if staleToken is not None and self.accessToken != staleToken and not self.isStale():
+                return self.accessToken
+            result = await self.refreshFunction()
+            if result is not None:
+                self.set(*result)
+            return self.accessToken
+
+    def stop(self) -> None:
+        """Cancels any pending background refresh."""
+        if self.__handle is not None:
+            self.__handle.cancel()
+            self.__handle = None
+
+    def __schedule(self) -> None:
+        """Arms a loop callback to refresh shortly before the margin is reached."""
+        self.stop()
+        if not self.background:
+            return
+        delay = self.expiresIn() - self.margin - random.uniform(0, self.jitter)
+        if delay <= 0:
+            return
+        import asyncio
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.__handle = loop.call_later(delay, lambda: loop.create_task(self.refresh(self.accessToken)))
@@ -0,0 +1,112 @@
+"""Compact record of the currently playing track, shared by Spotify and uSpotify (works on MicroPython)."""
+
+class TrackSnapshot:
+    __slots__ = ("id", "name", "artists", "link", "hq_art", "art", "playing")
+
+    def __init__(self, id=None, name=None, artists=None, link=None, hq_art=None, art=None, playing=False) -> None:
+        self.id = id
+        self.name = name
+        self.artists = artists
+        self.link = link
+        self.hq_art = hq_art
+        self.art = art
+        self.playing = playing
+
+    # Dict view, so a snapshot can be used wherever the formatted playback dictionary was
+    def keys(self) -> tuple:
+        return TrackSnapshot.__slots__
+
+    def __getitem__(self, key):
+        if key not in TrackSnapshot.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in TrackSnapshot.__slots__:
+            return default
+        return getattr(self, key)
+
+    def items(self) -> list:
+        return [(key, getattr(self, key)) for key in TrackSnapshot.__slots__]
+
+    def values(self) -> list:
+        return [getattr(self, key) for key in TrackSnapshot.__slots__]
+
+    def __iter__(self):
+        return iter(TrackSnapshot.__slots__)
+
+    def __contains__(self, key) -> bool:
+        return key in TrackSnapshot.__slots__
+
+    def __len__(self) -> int:
+        return len(TrackSnapshot.__slots__)
+
+    def asDict(self) -> dict:
+        """Returns the snapshot as the dictionary returned by requestFormattedPlayback."""
+        return {
+            "id":self.id,
+            "name":self.name,
+            "artists":self.artists,
+            "link":self.link,
+            "hq_art":self.hq_art,
+            "art":self.art,
+            "playing":self.playing
+        }
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TrackSnapshot):
+            other = other.asDict()
+        return self.asDict() == other
+
+    def __repr__(self) -> str:
+        return "TrackSnapshot(" + repr(self.asDict()) + ")"
+
+def extractSnapshot(data, snapshot=None) -> TrackSnapshot:
+    """Extracts the currently playing track from a /v1/me/player response in a single pass.\n
+    snapshot -> Existing TrackSnapshot to overwrite instead of allocating a new one (saves heap on MicroPython)"""
+    if snapshot is None:
+        snapshot = TrackSnapshot()
+    isDict = isinstance(data, dict)
+    item = data.get("item") if isDict else None
+    snapshot.playing = data.get("is_playing", False) if isDict else False
+    if not item:
+        snapshot.id = snapshot.name = snapshot.artists = snapshot.link = snapshot.hq_art = snapshot.art = None
+        return snapshot
+
+    snapshot.id = item.get("id")
+    snapshot.name = item.get("name")
+    artists = item.get("artists")
+    names = None if artists is None else [artist.get("name") for artist in artists]
+    snapshot.artists = None if names is None or None in names else ", ".join(names)
+    urls = item.get("external_urls")
+    snapshot.link = urls.get("spotify") if urls else None
+    album = item.get("album")
+    images = album.get("images") if album else None
+    snapshot.hq_art = images[0].get("url") if images else None
+    snapshot.art = images[2].get("url") if images and len(images) > 2 else None
+    return snapshot
+
+# /v1/me/player fields used by TrackSnapshot, for streaming extraction with uJSONStream.JSONExtractor
+PLAYBACK_PATHS = (
+    ("item", "id"),
+    ("item", "name"),
+    ("item", "artists", None, "name"),
+    ("item", "external_urls", "spotify"),
+    ("item", "album", "images", 0, "url"),
+    ("item", "album", "images", 2, "url"),
+    ("is_playing",)
+)
+
+def snapshotFromValues(values, snapshot=None) -> TrackSnapshot:
+    """Builds a TrackSnapshot from the values a JSONExtractor collected at PLAYBACK_PATHS."""
+    if snapshot is None:
+        snapshot = TrackSnapshot()
+    snapshot.id = values.get(PLAYBACK_PATHS[0])
+    snapshot.name = values.get(PLAYBACK_PATHS[1])
+    artists = values.get(PLAYBACK_PATHS[2])
+    snapshot.artists = None if artists is None or None in artists else ", ".join(artists)
+    snapshot.link = values.get(PLAYBACK_PATHS[3])
+    snapshot.hq_art = values.get(PLAYBACK_PATHS[4])
+    snapshot.art = values.get(PLAYBACK_PATHS[5])
+    snapshot.playing = values.get(PLAYBACK_PATHS[6], False)
+    return snapshot
@@ -0,0 +1,216 @@
+"""Local stand-in for the Spotify Web API and Accounts service, used by the benchmarks.\n
+Usage: python benchmarks/SpotifyStub.py [port] [latency seconds], e.g. to point a uSpotify device at it"""
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PLAYBACK = {
+    "is_playing": True,
+    "progress_ms": 1000,
+    "context": {"external_urls": {"spotify": "https://open.spotify.com/playlist/stubplaylist"}},
+    "item": {
+        "id": "stubtrack",
+        "name": "Stub Track",
+        "duration_ms": 180000,
+        "artists": [{"name": "Stub Artist"}],
+        "external_urls": {"spotify": "https://open.spotify.com/track/stubtrack"},
+        "album": {"images": [
+            {"url": "https://i.scdn.co/image/hq", "height": 640, "width": 640},
+            {"url": "https://i.scdn.co/image/mq", "height": 300, "width": 300},
+            {"url": "https://i.scdn.co/image/lq", "height": 64, "width": 64}
+        ]}
+    }
+}
+
+def playlistPage(url, playlistID, size, offset, limit) -> dict:
+    """A page of a playlist holding size generated tracks."""
+    items = []
+    for position in range(offset, min(offset + limit, size)):
+        trackID = f"{playlistID}track{position}"
+        items.append({"track": {
+            "id": trackID,
+            "uri": f"spotify:track:{trackID}",
+            "name": f"Track {position}",
+            "artists": [{"name": f"Artist {position % 50}"}],
+            "available_markets": ["GB", "US"]
+        }})
+    nextUrl = f"{url}/v1/playlists/{playlistID}/tracks?offset={offset + limit}&limit={limit}" if offset + limit < size else None
+    return {"items": items, "next": nextUrl, "offset": offset, "limit": limit, "total": size}
+
+def searchResults(query, limit) -> dict:
+    """Track results for a search, every query finds tracks except those starting with "nothing"."""
+    items = []
+    if not query.startswith("nothing"):
+        for position in range(min(limit, 20)):
+            trackID = "".join([c for c in query if c.isalnum()]) + str(position)
+            items.append({"id": trackID, "uri": f"spotify:track:{trackID}", "name": query, "artists": [{"name": "Stub Artist"}]})
+    return {"tracks": {"items": items, "limit": limit, "offset": 0, "total": len(items), "next": None}}
+
+class SpotifyStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment, otherwise Nagle's algorithm stalls kept-alive connections
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def sendJSON(self, status, body=None, etag=None) -> None:
+        payload = b"" if body is None else json.dumps(body).encode()
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            status, payload = 304, b""
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def sendError(self, status, message, headers=None) -> None:
+        payload = json.dumps({"error": {"status": status, "message": message}}).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def rejected(self) -> bool:
+        """Answers API requests with the next queued failure, 429 above the rate limit or 401 for an invalid access token."""
+        server = self.server
+        if server.failures:
+            status, headers = server.failures.pop(0)
+            self.sendError(status, "Injected failure", headers)
+            return True
+        if server.rateLimit is not None:
+            with server.lock:
+                now = time.monotonic()
+                while server.window and server.window[0] <= now - 1:
+                    server.window.pop(0)
+                limited = len(server.window) >= server.rateLimit
+                if not limited:
+                    server.window.append(now)
+            if limited:
+                server.throttled += 1
+                self.sendError(429, "API rate limit exceeded", {"Retry-After": "1"})
+                return True
+        if server.validateTokens:
+            token = (self.headers.get("Authorization") or "").replace("Bearer ", "", 1)
+            if server.tokens.get(token, 0) <= time.monotonic():
+                server.unauthorized += 1
+                self.sendError(401, "The access token expired")
+                return True
+        return False
+
+    def do_GET(self) -> None:
+        self.server.requests += 1
+        time.sleep(self.server.latency)
+        if self.rejected():
+            return
+        path = urlsplit(self.path)
+        query = parse_qs(path.query)
+        parts = path.path.strip("/").split("/")
+        if path.path == "/v1/me/player":
+            if self.server.playback is None:
+                self.sendJSON(204)
+            else:
+                self.sendJSON(200, self.server.playback)
+        elif path.path == "/v1/me/player/queue":
+            self.sendJSON(200, {"currently_playing": PLAYBACK["item"], "queue": [{"uri": uri} for uri in self.server.queue]})
+        elif path.path == "/v1/search":
+            self.sendJSON(200, searchResults(query.get("q", [""])[0], int(query.get("limit", ["20"])[0])))
+        elif parts[:2] == ["v1", "playlists"] and len(parts) == 3:
+            self.sendJSON(200, {"id": parts[2], "name": f"Playlist {parts[2]}", "snapshot_id": f"snapshot{self.server.playlistVersion}", "tracks": {"total": self.server.playlistSize}})
+        elif parts[:2] == ["v1", "playlists"] and len(parts) == 4 and parts[3] == "tracks":
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["100"])[0])
+            self.sendJSON(200, playlistPage(self.server.url, parts[2], self.server.playlistSize, offset, limit))
+        elif parts[:2] == ["v1", "playlists"] and len(parts) == 4 and parts[3] == "images":
+            self.sendJSON(200, [{"url": f"https://i.scdn.co/image/{parts[2]}", "height": 640, "width": 640}], etag=f'"{parts[2]}"')
+        else:
+            self.sendJSON(404, {"error": {"status": 404, "message": "Not found"}})
+
+    def do_POST(self) -> None:
+        self.server.requests += 1
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(self.server.latency)
+        path = urlsplit(self.path)
+        if path.path == "/api/token":
+            self.token(body)
+            return
+        if self.rejected():
+            return
+        if path.path == "/v1/me/player/queue":
+            self.server.queue.append(parse_qs(path.query)["uri"][0])
+            self.sendJSON(204)
+        elif path.path in ("/v1/me/player/next", "/v1/me/player/previous"):
+            self.server.skips.append(path.path.rsplit("/", 1)[1])
+            self.sendJSON(204)
+        else:
+            self.sendJSON(204)
+
+    def token(self, body) -> None:
+        """Issues a new access token, with a refresh token for authorization_code grants."""
+        form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        server = self.server
+        accessToken = f"stubaccesstoken{next(server.issued)}"
+        server.tokens[accessToken] = time.monotonic() + server.tokenLifetime
+        response = {"access_token": accessToken, "token_type": "Bearer", "expires_in": server.tokenLifetime}
+        if form.get("grant_type") == "authorization_code":
+            response["refresh_token"] = "stubrefreshtoken"
+        self.sendJSON(200, response)
+
+class SpotifyStub:
+    def __init__(self, latency=0.0, playlistSize=1000, host="127.0.0.1", port=0, playback=PLAYBACK, rateLimit=None, validateTokens=False, tokenLifetime=3600) -> None:
+        """latency -> Seconds the stub waits before answering each request\n
+        playlistSize -> Number of tracks in every playlist\n
+        playback -> /v1/me/player response (e.g. a recorded payload from benchmarks/payloads), None answers 204 No Content\n
+        rateLimit -> API requests allowed per second before answering 429 with Retry-After, None for no limit\n
+        validateTokens -> Answer 401 to API requests without an unexpired access token issued by /api/token\n
+        tokenLifetime -> expires_in of the issued access tokens, in seconds"""
+        self.server = ThreadingHTTPServer((host, port), SpotifyStubHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.playlistSize = playlistSize
+        self.server.playlistVersion = 0 # Part of every playlists snapshot_id, increment it to make them change
+        self.server.playback = playback
+        self.server.rateLimit = rateLimit
+        self.server.validateTokens = validateTokens
+        self.server.tokenLifetime = tokenLifetime
+        self.server.lock = threading.Lock()
+        self.server.window = [] # Times of the API requests in the last second, for rateLimit
+        self.server.tokens = {} # Access token: time.monotonic() at which it expires
+        self.server.issued = itertools.count()
+        self.server.requests = 0
+        self.server.throttled = 0 # 429 responses sent for rateLimit
+        self.server.unauthorized = 0 # 401 responses sent for validateTokens
+        self.server.queue = [] # URIs added with POST /v1/me/player/queue
+        self.server.skips = [] # "next" or "previous", for every skip
+        self.server.failures = [] # (status, headers) answered to the next API requests, e.g. (429, {"Retry-After": "1"})
+        self.url = f"http://{host}:{self.server.server_port}"
+        self.server.url = self.url
+
+    def expireTokens(self) -> None:
+        """Expires every issued access token, so the next API requests are answered 401 (with validateTokens)."""
+        self.server.tokens.clear()
+
+    def start(self) -> "SpotifyStub":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    stub = SpotifyStub(latency=latency, host="0.0.0.0", port=port)
+    print(f"Spotify stub listening on port {port}")
+    stub.server.serve_forever()
@@ -0,0 +1,76 @@
+"""Bytes downloaded for album art over a listening session: a device fetching the 640px JPEG on every track change,\n
+versus an ArtCache downloading each image once and the device receiving a pre-scaled rendition. Also times cold and warm gets.\n
+Needs Pillow to generate the images and scale them.\n
+Usage: python benchmarks/albumart.py [track changes] [distinct albums] [rendition, e.g. thumb or lcd]"""
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from AlbumArt import ArtCache
+
+try:
+    from PIL import Image
+except ImportError:
+    sys.exit("Pillow is required: pip install Pillow")
+
+def albumImage(seed) -> bytes:
+    """A 640px JPEG with enough detail to compress like real album art."""
+    generator = random.Random(seed)
+    image = Image.radial_gradient("L").resize((640, 640)).convert("RGB")
+    noise = Image.effect_noise((640, 640), 40).convert("RGB")
+    tint = Image.new("RGB", (640, 640), tuple(generator.randrange(256) for _ in range(3)))
+    image = Image.blend(Image.blend(image, noise, 0.3), tint, 0.4)
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        body = self.server.images[self.path.strip("/")]
+        self.server.sent += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+if __name__ == "__main__":
+    changes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    albums = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rendition = sys.argv[3] if len(sys.argv) > 3 else "thumb"
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    server.images = {str(album): albumImage(album) for album in range(albums)}
+    server.sent = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_port}/{random.Random(change).randrange(albums)}" for change in range(changes)]
+
+    direct = sum(len(server.images[url.rsplit("/", 1)[1]]) for url in urls) # Device downloading the JPEG on every change
+
+    with tempfile.TemporaryDirectory() as folder:
+        cache = ArtCache(folder)
+        device = 0
+        cold, warm = [], []
+        for url in urls:
+            start = time.perf_counter()
+            downloads = cache.downloads
+            device += len(cache.get(url, rendition))
+            (cold if cache.downloads > downloads else warm).append(time.perf_counter() - start)
+        upstream = server.sent
+    server.shutdown()
+
+    print(f"{changes} track changes over {albums} albums, rendition {rendition} {cache.renditions[rendition]}")
+    print(f"direct to device        {direct / 1024:10.1f} KiB")
+    print(f"cache, upstream         {upstream / 1024:10.1f} KiB ({cache.downloads} downloads)")
+    print(f"cache, to device        {device / 1024:10.1f} KiB")
+    print(f"cold get (download + scale) {sum(cold) / max(len(cold), 1) * 1000:8.2f} ms")
+    print(f"warm get (from disk)        {sum(warm) / max(len(warm), 1) * 1000:8.2f} ms")
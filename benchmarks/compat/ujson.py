@@ -0,0 +1,2 @@
+"""CPython stand-in for MicroPython's ujson, so the benchmarks can run uSpotify against the local stub."""
+from json import loads, dumps, load, dump # noqa: F401
@@ -0,0 +1,2 @@
+"""CPython stand-in for MicroPython's urequests, so the benchmarks can run uSpotify against the local stub."""
+from requests import request, get, post # noqa: F401
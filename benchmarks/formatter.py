@@ -0,0 +1,88 @@
+"""Time and allocations of formatting recorded /v1/me/player payloads, comparing the original formatter with extractSnapshot.\n
+Usage: python benchmarks/formatter.py [iterations]"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from TrackSnapshot import TrackSnapshot, extractSnapshot
+
+PAYLOADS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+
+def legacyFormat(data) -> dict:
+    """The formatter requestFormattedPlayback used before TrackSnapshot."""
+    try:
+        trackID = data['item']['id']
+    except KeyError:
+        trackID = None
+    try:
+        trackName = data['item']['name']
+    except KeyError:
+        trackName = None
+    try:
+        names = []
+        for i in range(0, len(data['item']['artists'])):
+            names.append(data['item']['artists'][i]["name"])
+        trackArtists = ", ".join(names)
+    except KeyError:
+        trackArtists = None
+    try:
+        link = data['item']['external_urls']['spotify']
+    except:
+        link = None
+    try:
+        try:
+            lqAlbumArt = data["item"]["album"]["images"][2]["url"]
+        except KeyError:
+            lqAlbumArt = None
+        try:
+            hqAlbumArt = data["item"]["album"]["images"][0]["url"]
+        except KeyError:
+            hqAlbumArt = None
+    except IndexError:
+        lqAlbumArt = None
+        hqAlbumArt = None
+    try:
+        playing = data["is_playing"]
+    except KeyError:
+        playing = False
+    return {"id":trackID, "name":trackName, "artists":trackArtists, "link":link, "hq_art":hqAlbumArt, "art":lqAlbumArt, "playing":playing}
+
+def allocated(function, iterations=1000) -> float:
+    """Average bytes allocated per call."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [function() for _ in range(iterations)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / iterations
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    reused = TrackSnapshot()
+    for name in sorted(os.listdir(PAYLOADS)):
+        with open(os.path.join(PAYLOADS, name), "rb") as f:
+            raw = f.read()
+        data = json.loads(raw)
+        print(name)
+        cases = [
+            ("legacy dict", lambda: legacyFormat(data)),
+            ("snapshot", lambda: extractSnapshot(data)),
+            ("snapshot reused", lambda: extractSnapshot(data, reused)),
+            ("snapshot asDict", lambda: extractSnapshot(data).asDict())
+        ]
+        for label, function in cases:
+            seconds = timeit.timeit(function, number=iterations)
+            print(f"  {label:<18} {seconds / iterations * 1e9:8.0f} ns/call  {allocated(function):6.0f} B/call")
+
+        parsers = [("json", json.loads)]
+        try:
+            import orjson
+            parsers.append(("orjson", orjson.loads))
+        except ImportError:
+            pass
+        for label, loads in parsers:
+            seconds = timeit.timeit(lambda: loads(raw), number=iterations // 10)
+            print(f"  parse {label:<12} {seconds / (iterations // 10) * 1e6:8.1f} us/call")
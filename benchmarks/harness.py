@@ -0,0 +1,132 @@
+"""Throughput, p50/p99 latency and peak memory of the Spotify and uSpotify request paths, measured against the local stub.\n
+uSpotify runs on CPython through the stand-ins in benchmarks/compat. The stub validates access tokens, so the 401 scenarios exercise the refresh path.\n
+Usage: python benchmarks/harness.py [iterations] [latency seconds] [--json]"""
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, ".."))
+try:
+    import urequests # noqa: F401
+except ImportError:
+    sys.path.append(os.path.join(BENCHMARKS, "compat"))
+
+from RequestScheduler import RequestScheduler
+from Spotify import Spotify
+from uSpotify import uSpotify
+from SpotifyStub import SpotifyStub
+
+PAYLOAD = os.path.join(BENCHMARKS, "payloads", "player.json")
+
+def measure(function, iterations) -> dict:
+    """Calls function iterations times after a warm up call, then once more under tracemalloc for its peak heap use."""
+    function()
+    timings = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        callStart = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - callStart)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "throughput": iterations / elapsed,
+        "p50": statistics.median(timings) * 1000,
+        "p99": timings[max(int(len(timings) * 0.99) - 1, 0)] * 1000,
+        "peak": peak / 1024
+    }
+
+def spotifyScenarios(stub) -> tuple:
+    client = Spotify(
+        "stub", "stub", "http://127.0.0.1/callback", "user-read-playback-state",
+        API_URL=stub.url, ACCOUNTS_URL=stub.url, REFRESH_TOKEN="stubrefreshtoken",
+        cache=False, scheduler=RequestScheduler(rate=1e9, burst=1e9, backoff=0)
+    )
+
+    def expired():
+        stub.expireTokens()
+        client.requestPlayback()
+
+    def throttled():
+        stub.server.failures.append((429, {"Retry-After": "0"}))
+        client.requestPlayback()
+
+    scenarios = [
+        ("requestPlayback", client.requestPlayback),
+        ("requestFormattedPlayback", client.requestFormattedPlayback),
+        ("search", lambda: client.search("harness query", "track", limit=1)),
+        ("addToQueue", lambda: client.addToQueue("spotify:track:harness")),
+        ("skip", client.skip),
+        ("getPlaylistItems", lambda: client.getPlaylistItems("harness")),
+        ("iterPlaylistItems (1000)", lambda: sum(1 for track in client.iterPlaylistItems("harness"))),
+        ("requestPlayback 401 refresh", expired),
+        ("requestPlayback 429 retry", throttled)
+    ]
+    return client, scenarios
+
+def uSpotifyScenarios(stub, folder) -> tuple:
+    with open(os.path.join(folder, "credentials.json"), "w") as f:
+        json.dump({"REFRESHKEY": "stubrefreshtoken"}, f)
+    cwd = os.getcwd()
+    os.chdir(folder) # uSpotify reads credentials.json from the working directory, as on the device
+    try:
+        client = uSpotify("stub", "stub", "http://127.0.0.1/callback", "user-read-playback-state", "Etc/UTC", API_URL=stub.url, ACCOUNTS_URL=stub.url)
+    finally:
+        os.chdir(cwd)
+
+    def expired():
+        stub.expireTokens()
+        with contextlib.redirect_stdout(io.StringIO()): # uSpotify prints on every 401
+            client.requestPlayback()
+
+    scenarios = [
+        ("requestPlayback", client.requestPlayback),
+        ("requestFormattedPlayback", client.requestFormattedPlayback),
+        ("requestFormattedPlayback stream", lambda: client.requestFormattedPlayback(stream=True)),
+        ("search", lambda: client.search("harness query", "track")),
+        ("skip", client.skip),
+        ("requestPlayback 401 refresh", expired)
+    ]
+    return client, scenarios
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if not argument.startswith("--")]
+    iterations = int(arguments[0]) if len(arguments) > 0 else 200
+    latency = float(arguments[1]) if len(arguments) > 1 else 0.0
+    with open(PAYLOAD, "rb") as f:
+        playback = json.load(f)
+
+    stub = SpotifyStub(latency=latency, playback=playback, validateTokens=True).start()
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        spotify, scenarios = spotifyScenarios(stub)
+        for name, function in scenarios:
+            results.append({"client": "Spotify", "scenario": name, **measure(function, iterations)})
+        spotify.tokens.stop()
+        spotify.session.close()
+
+        micro, scenarios = uSpotifyScenarios(stub, folder)
+        for name, function in scenarios:
+            results.append({"client": "uSpotify", "scenario": name, **measure(function, iterations)})
+    stub.stop()
+
+    if "--json" in sys.argv:
+        print(json.dumps({"iterations": iterations, "latency": latency, "results": results}, indent=1))
+    else:
+        print(f"{iterations} iterations, {latency * 1000:.0f} ms stub latency")
+        print(f"{'client':<9} {'scenario':<32} {'calls/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'peak KiB':>9}")
+        for result in results:
+            print(f"{result['client']:<9} {result['scenario']:<32} {result['throughput']:9.1f} {result['p50']:8.3f} {result['p99']:8.3f} {result['peak']:9.1f}")
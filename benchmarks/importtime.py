@@ -0,0 +1,75 @@
+"""Import time of each client module in a fresh interpreter (median of several runs), the modules it loads, whether requests is among them,\n
+and the .mpy bytes a device imports for uSpotify (when mpy-cross is installed, see micropython/build.py).\n
+Usage: python benchmarks/importtime.py [runs] [tree], tree defaulting to this checkout, e.g. a checkout of an older commit to compare against"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, "..", "micropython"))
+
+MODULES = ("SpotifyCore", "Spotify", "AsyncSpotify", "SpotifyPool", "PlaybackServer", "uSpotify")
+
+# Run in the fresh interpreter, urequests and ujson come from benchmarks/compat as on the benchmarks harness
+PROBE = """
+import sys, time, json
+sys.path.insert(0, sys.argv[1])
+sys.path.append(sys.argv[2])
+before = set(sys.modules)
+start = time.perf_counter()
+__import__(sys.argv[3])
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": len(set(sys.modules) - before), "requests": "requests" in sys.modules, "loaded": sorted(sys.modules)}))
+"""
+
+def probe(tree, module) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, tree, os.path.join(BENCHMARKS, "compat"), module],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output)
+
+def measure(tree, module, runs) -> dict:
+    results = [probe(tree, module) for _ in range(runs)]
+    return {
+        "ms": statistics.median([result["seconds"] for result in results]) * 1000,
+        "modules": results[0]["modules"],
+        "requests": results[0]["requests"],
+        "loaded": results[0]["loaded"]
+    }
+
+def deviceBytes(tree, loaded) -> tuple:
+    """(.py bytes, .mpy bytes) of the repository modules loaded by import uSpotify, None if mpy-cross is not installed."""
+    try:
+        from build import build
+    except ImportError:
+        return None
+    modules = [f"{name}.py" for name in loaded if os.path.exists(os.path.join(tree, f"{name}.py"))]
+    with tempfile.TemporaryDirectory() as output:
+        try:
+            sizes = build(output, root=tree, modules=modules)
+        except FileNotFoundError:
+            return None
+    return sum(size[1] for size in sizes), sum(size[2] for size in sizes)
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    tree = os.path.abspath(sys.argv[2]) if len(sys.argv) > 2 else os.path.abspath(os.path.join(BENCHMARKS, ".."))
+
+    print(f"{runs} runs of {tree}")
+    print(f"{'module':<16} {'import ms':>10} {'modules':>8} {'requests':>9}")
+    loaded = None
+    for module in MODULES:
+        if not os.path.exists(os.path.join(tree, f"{module}.py")):
+            continue
+        result = measure(tree, module, runs)
+        print(f"{module:<16} {result['ms']:>10.1f} {result['modules']:>8} {str(result['requests']):>9}")
+        if module == "uSpotify":
+            loaded = result["loaded"]
+
+    sizes = deviceBytes(tree, loaded) if loaded is not None else None
+    if sizes is not None:
+        print(f"uSpotify imports {sizes[0]} bytes of .py, {sizes[1]} bytes of .mpy")
@@ -0,0 +1,35 @@
+"""Time to stream a large playlist with sequential next links and with concurrent prefetching, measured against the local stub.\n
+Usage: python benchmarks/playlist.py [tracks] [latency seconds]"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from RequestScheduler import RequestScheduler
+from Spotify import Spotify
+from SpotifyStub import SpotifyStub
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    stub = SpotifyStub(latency=latency, playlistSize=size).start()
+    with tempfile.TemporaryDirectory() as folder:
+        with open(os.path.join(folder, "credentials.json"), "w") as f:
+            json.dump({"REFRESHKEY": "stubrefreshtoken"}, f)
+        # Uncached and unthrottled, so every run downloads every page as fast as the stub answers
+        client = Spotify("stub", "stub", "http://127.0.0.1/callback", "playlist-read-private", folder + os.sep, stub.url, stub.url, cache=False, scheduler=RequestScheduler(rate=1e9, burst=1e9))
+        for prefetch in (0, 2, 4, 8):
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = 0
+            for track in client.iterPlaylistItems("stubplaylist", prefetch=prefetch):
+                count += 1
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"prefetch {prefetch}: {count} tracks in {elapsed:.3f} s, peak {peak / 1024:.0f} KiB")
+        client.tokens.stop()
+    stub.stop()
@@ -0,0 +1,47 @@
+"""Lookups in a synced PlaylistIndex compared with paging through the playlist, measured against the local stub.\n
+Usage: python benchmarks/playlistindex.py [tracks] [latency seconds]"""
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from PlaylistIndex import PlaylistIndex
+from RequestScheduler import RequestScheduler
+from Spotify import Spotify
+from SpotifyStub import SpotifyStub
+
+def perCall(function, number) -> float:
+    """Microseconds per call."""
+    return timeit.timeit(function, number=number) / number * 1e6
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    stub = SpotifyStub(latency=latency, playlistSize=size).start()
+    client = Spotify(
+        "stub", "stub", "http://127.0.0.1/callback", "playlist-read-private",
+        API_URL=stub.url, ACCOUNTS_URL=stub.url, REFRESH_TOKEN="stubrefreshtoken",
+        cache=False, scheduler=RequestScheduler(rate=1e9, burst=1e9)
+    )
+    index = PlaylistIndex(client)
+    trackID = f"stubplaylisttrack{size - 1}"
+
+    start = time.perf_counter()
+    index.sync("stubplaylist")
+    print(f"first sync of {size} tracks    {time.perf_counter() - start:9.3f} s")
+    start = time.perf_counter()
+    index.sync("stubplaylist")
+    print(f"sync, snapshot unchanged      {time.perf_counter() - start:9.3f} s")
+
+    start = time.perf_counter()
+    found = any(track.id == trackID for track in client.iterPlaylistItems("stubplaylist"))
+    print(f"contains by paging the API    {(time.perf_counter() - start) * 1e6:9.0f} us")
+    print(f"contains (first, loads set)   {perCall(lambda: index.contains('stubplaylist', trackID), 1):9.1f} us")
+    print(f"contains                      {perCall(lambda: index.contains('stubplaylist', trackID), 100000):9.2f} us")
+    print(f"positions                     {perCall(lambda: index.positions('stubplaylist', trackID), 10000):9.2f} us")
+    print(f"playlistsContaining           {perCall(lambda: index.playlistsContaining(trackID), 10000):9.2f} us")
+    print(f"search name prefix            {perCall(lambda: index.search('stubplaylist', 'track 999', 10), 10000):9.2f} us")
+
+    client.tokens.stop()
+    stub.stop()
@@ -0,0 +1,43 @@
+"""Per-request latency of the Spotify client with and without connection pooling, measured against the local stub.\n
+Usage: python benchmarks/pooling.py [requests]"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from HTTPSession import HTTPSession
+from RequestScheduler import RequestScheduler
+from Spotify import Spotify
+from SpotifyStub import SpotifyStub
+
+def measure(session, stub, folder, count) -> list:
+    # Unthrottled, so the client-side rate limit doesn't hide the connection setup cost
+    client = Spotify("stub", "stub", "http://127.0.0.1/callback", "user-read-playback-state", folder, stub.url, stub.url, session, scheduler=RequestScheduler(rate=1e9, burst=1e9))
+    client.requestPlayback() # warm up
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        client.requestPlayback()
+        timings.append(time.perf_counter() - start)
+    client.tokens.stop()
+    session.close()
+    return timings
+
+def report(name, timings) -> None:
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{name:<12} mean {statistics.mean(timings) * 1000:7.3f} ms   p50 {statistics.median(timings) * 1000:7.3f} ms   p99 {p99 * 1000:7.3f} ms")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    stub = SpotifyStub().start()
+    with tempfile.TemporaryDirectory() as folder:
+        with open(os.path.join(folder, "credentials.json"), "w") as f:
+            json.dump({"REFRESHKEY": "stubrefreshtoken"}, f)
+        folder += os.sep
+        report("unpooled", measure(HTTPSession(pooled=False), stub, folder, count))
+        report("pooled", measure(HTTPSession(), stub, folder, count))
+    stub.stop()
@@ -0,0 +1,74 @@
+"""Peak heap and time of extracting a TrackSnapshot from recorded /v1/me/player payloads, parsing the whole body\n
+versus streaming it through uJSONStream.JSONExtractor in socket-sized chunks as uSpotify does.\n
+Usage: python benchmarks/streaming.py [iterations] [chunk size]"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from TrackSnapshot import TrackSnapshot, extractSnapshot, snapshotFromValues, PLAYBACK_PATHS
+from uJSONStream import JSONExtractor
+
+PAYLOADS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+
+# Artists the two paths must read alike, substituted into every payload: one without a name, and none at all
+ARTISTS = ([{"name": "q"}, {"x": 1}, {"name": "r"}], [])
+
+def chunks(raw, size) -> list:
+    """Splits a payload as it would arrive from the socket."""
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+def parsed(received, snapshot) -> TrackSnapshot:
+    """The non-streamed path, the body is joined then parsed whole."""
+    return extractSnapshot(json.loads(b"".join(received)), snapshot)
+
+def streamed(received, extractor, snapshot) -> TrackSnapshot:
+    extractor.reset()
+    for chunk in received:
+        extractor.feed(chunk)
+        if extractor.done:
+            break
+    return snapshotFromValues(extractor.values, snapshot)
+
+def peak(function) -> int:
+    """Peak bytes allocated during one call."""
+    tracemalloc.start()
+    function()
+    size = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    chunkSize = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    extractor = JSONExtractor(PLAYBACK_PATHS)
+    snapshot = TrackSnapshot()
+    for name in sorted(os.listdir(PAYLOADS)):
+        with open(os.path.join(PAYLOADS, name), "rb") as f:
+            raw = f.read()
+        received = chunks(raw, chunkSize)
+        expected = extractSnapshot(json.loads(raw)).asDict()
+        assert streamed(received, extractor, TrackSnapshot()) == expected, name
+        for size in (1, 7, 64, 4096):
+            assert streamed(chunks(raw, size), extractor, TrackSnapshot()) == expected, (name, size)
+        data = json.loads(raw)
+        if data.get("item"):
+            for artists in ARTISTS:
+                data["item"]["artists"] = artists
+                edited = json.dumps(data).encode()
+                assert streamed(chunks(edited, chunkSize), extractor, TrackSnapshot()) == extractSnapshot(data).asDict(), (name, artists)
+
+        print(f"{name} ({len(raw)} bytes, {len(received)} chunks of {chunkSize})")
+        cases = [
+            ("parse whole", lambda: parsed(received, snapshot)),
+            ("streamed", lambda: streamed(received, extractor, snapshot))
+        ]
+        for label, function in cases:
+            function()
+            start = time.perf_counter()
+            for _ in range(iterations):
+                function()
+            seconds = time.perf_counter() - start
+            print(f"  {label:<12} {seconds / iterations * 1e6:8.1f} us/call  peak {peak(function):6d} B")
@@ -0,0 +1,81 @@
+"""Compares URLEncoding with the implementation it replaced. Runs on CPython and MicroPython:\n
+python benchmarks/urlencoding.py\n
+micropython benchmarks/urlencoding.py (from the repository root)"""
+import sys
+import time
+try:
+    import os.path
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+except ImportError: # MicroPython
+    sys.path.append(".")
+from URLEncoding import urlencoding
+try:
+    from urllib.parse import quote, urlencode
+except ImportError:
+    quote = urlencode = None
+
+class legacy:
+    """URLEncoding before the lookup tables were introduced."""
+    def quote(s):
+        always_safe = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ' 'abcdefghijklmnopqrstuvwxyz' '0123456789' '_.-'
+        res = []
+        for c in s:
+            if c in always_safe:
+                res.append(c)
+                continue
+            res.append('%%%x' % ord(c))
+        return ''.join(res)
+
+    def quote_plus(s):
+        s = legacy.quote(s)
+        if ' ' in s:
+            s = s.replace(' ', '+')
+        return s
+
+    def urlencode(query):
+        if isinstance(query, dict):
+            query = query.items()
+        li = []
+        for k, v in query:
+            if not isinstance(v, list):
+                v = [v]
+            for value in v:
+                k = legacy.quote_plus(str(k))
+                v = legacy.quote_plus(str(value))
+                li.append(k + '=' + v)
+        return '&'.join(li)
+
+def clock() -> float:
+    try:
+        return time.perf_counter()
+    except AttributeError:
+        return time.ticks_us() / 1000000
+
+def measure(function, argument, iterations) -> float:
+    """Microseconds per call."""
+    start = clock()
+    for _ in range(iterations):
+        function(argument)
+    return (clock() - start) / iterations * 1000000
+
+INPUTS = [
+    ("uri", "spotify:track:6LgJvl0Xdtc73RJ1mmpotq"),
+    ("search", "artist:Radiohead track:Let Down"),
+    ("unicode", "Sigur Rós Hoppípolla"),
+    ("refresh form", {"grant_type": "refresh_token", "refresh_token": "AQDx7kU3mVnR4sd9yT2bWQ" * 6})
+]
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(sys.implementation.name)
+    for name, value in INPUTS:
+        if isinstance(value, dict):
+            cases = [("legacy", legacy.urlencode), ("urlencoding", urlencoding.urlencode)]
+            if urlencode is not None:
+                cases.append(("urllib", urlencode))
+        else:
+            cases = [("legacy", legacy.quote), ("urlencoding", urlencoding.quote), ("quote_plus", urlencoding.quote_plus)]
+            if quote is not None:
+                cases.append(("urllib", lambda s: quote(s, safe="")))
+        for label, function in cases:
+            print("%-14s %-12s %8.2f us" % (name, label, measure(function, value, iterations)))
@@ -0,0 +1,45 @@
+"""Compiles the modules a uSpotify device needs to .mpy bytecode with mpy-cross: smaller on flash, and imported without compiling on the device\n
+(which on a Pico needs more free heap than the module itself). Copy the output to the device, e.g. mpremote cp micropython/build/*.mpy :\n
+or freeze the modules into the firmware with micropython/manifest.py, keeping their bytecode in flash instead of RAM.\n
+Needs mpy-cross matching the MicroPython version of the device (pip install mpy-cross).\n
+Usage: python micropython/build.py [output folder] [mpy-cross arguments, e.g. -march=armv6m]"""
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Everything uSpotify and uPlaybackClient import, keep micropython/manifest.py in step
+DEVICE_MODULES = ("uSpotify.py", "uPlaybackClient.py", "SpotifyCore.py", "URLEncoding.py", "TrackSnapshot.py", "uJSONStream.py", "udatetime.py")
+
+def mpyCross() -> list:
+    """Command running mpy-cross, from PATH or the mpy_cross package."""
+    if shutil.which("mpy-cross"):
+        return ["mpy-cross"]
+    if importlib.util.find_spec("mpy_cross") is not None:
+        return [sys.executable, "-m", "mpy_cross"]
+    raise FileNotFoundError("mpy-cross was not found, install it with pip install mpy-cross")
+
+def build(output, arguments=(), root=ROOT, modules=DEVICE_MODULES) -> list:
+    """Compiles the modules found in root into output, returns [(module, source bytes, .mpy bytes)]."""
+    os.makedirs(output, exist_ok=True)
+    command = mpyCross()
+    sizes = []
+    for module in modules:
+        source = os.path.join(root, module)
+        target = os.path.join(output, module[:-3] + ".mpy")
+        subprocess.run(command + list(arguments) + ["-o", target, "-s", module, source], check=True)
+        sizes.append((module, os.path.getsize(source), os.path.getsize(target)))
+    return sizes
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if argument.startswith("-")]
+    folders = [argument for argument in sys.argv[1:] if not argument.startswith("-")]
+    output = folders[0] if folders else os.path.join(os.path.dirname(os.path.abspath(__file__)), "build")
+    sizes = build(output, arguments)
+    print(f"{'module':<20} {'.py bytes':>10} {'.mpy bytes':>11}")
+    for module, source, compiled in sizes:
+        print(f"{module:<20} {source:>10} {compiled:>11}")
+    print(f"{'total':<20} {sum(size[1] for size in sizes):>10} {sum(size[2] for size in sizes):>11}")
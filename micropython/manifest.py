@@ -0,0 +1,7 @@
+# Freezes uSpotify into MicroPython firmware in place of the board manifest (which it includes), so its bytecode runs from flash and costs no heap to import. Build from the micropython repository with
+# make -C ports/rp2 BOARD=RPI_PICO_W FROZEN_MANIFEST=/path/to/this/manifest.py
+include("$(BOARD_DIR)/manifest.py") # The board's own modules, including requests (urequests) on the Pico W
+
+# Same list as DEVICE_MODULES in micropython/build.py
+for name in ("uSpotify.py", "uPlaybackClient.py", "SpotifyCore.py", "URLEncoding.py", "TrackSnapshot.py", "uJSONStream.py", "udatetime.py"):
+    module(name, base_path="..")
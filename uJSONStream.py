@@ -0,0 +1,265 @@
+"""Streaming JSON field extraction for MicroPython, keeping only the values at the requested paths so a large response never has to fit in the heap."""
+
+# Parser states
+VALUE = 0 # Expecting a value (or the end of an empty array)
+KEY = 1 # Expecting a key (or the end of an empty object)
+COLON = 2
+AFTER = 3 # After a value, expecting , or the end of a container
+STRING = 4
+ESCAPE = 5
+UNICODE = 6
+LITERAL = 7 # Number, true, false or null
+SKIP = 8 # Inside a container no requested path goes through
+SKIP_STRING = 9
+SKIP_ESCAPE = 10
+DONE = 11
+
+QUOTE = 34 # "
+BACKSLASH = 92
+OPEN_OBJECT = 123 # {
+CLOSE_OBJECT = 125 # }
+OPEN_ARRAY = 91 # [
+CLOSE_ARRAY = 93 # ]
+COMMA = 44
+WHITESPACE = b" \t\r\n"
+ESCAPES = {98: 8, 102: 12, 110: 10, 114: 13, 116: 9} # \b \f \n \r \t, anything else stands for itself
+
+class JSONExtractor:
+    def __init__(self, paths, maxValue=256) -> None:
+        """paths -> Paths of the values to keep, as tuples of keys and array indices, None matching any index\n
+        e.g. ("item", "artists", None, "name") collects every artists name into a list, with None for an artist without one\n
+        (the list is empty for an empty array, and missing if there is no array). At most one None per path\n
+        maxValue -> Size of the preallocated buffer values are captured into, longer strings are truncated"""
+        self.paths = [tuple(path) for path in paths]
+        self.__buffer = bytearray(maxValue)
+        self.reset()
+
+    def reset(self) -> None:
+        """Prepares to parse a new document."""
+        self.values = {}
+        self.done = False
+        self.__path = []
+        self.__containers = []
+        self.__state = VALUE
+        self.__length = 0
+        self.__capture = False
+        self.__isKey = False
+        self.__skipDepth = 0
+        self.__unicode = 0
+        self.__unicodeDigits = 0
+        self.__highSurrogate = 0
+
+    def __follows(self, wanted) -> bool:
+        """True if the current path is wanted, or the start of it."""
+        path = self.__path
+        for i in range(len(path)):
+            if wanted[i] != path[i] and not (wanted[i] is None and type(path[i]) is int):
+                return False
+        return True
+
+    def __matches(self, prefix) -> bool:
+        """True if the current path is a requested path (or, with prefix, leads to one)."""
+        depth = len(self.__path)
+        for wanted in self.paths:
+            if (len(wanted) >= depth if prefix else len(wanted) == depth) and self.__follows(wanted):
+                return True
+        return False
+
+    def __store(self, value) -> None:
+        depth = len(self.__path)
+        for wanted in self.paths:
+            if len(wanted) == depth and self.__follows(wanted):
+                if None in wanted:
+                    self.values.setdefault(wanted, []).append(value)
+                else:
+                    self.values[wanted] = value
+                return
+
+    def __wildcards(self):
+        """Paths collected into a list whose None matches the array the current path is an index of."""
+        depth = len(self.__path)
+        for wanted in self.paths:
+            if len(wanted) >= depth and wanted[depth - 1] is None and self.__follows(wanted):
+                yield wanted
+
+    def __pad(self) -> None:
+        """Ends an array element, standing None in for the value of each list it did not add to."""
+        index = self.__path[-1]
+        for wanted in self.__wildcards():
+            values = self.values.setdefault(wanted, [])
+            while len(values) <= index:
+                values.append(None)
+
+    def __append(self, byte) -> None:
+        if self.__capture and self.__length < len(self.__buffer):
+            self.__buffer[self.__length] = byte
+            self.__length += 1
+
+    def __appendCodepoint(self, code) -> None:
+        """Appends an escaped character as UTF-8, joining UTF-16 surrogate pairs."""
+        if 0xD800 <= code < 0xDC00:
+            self.__highSurrogate = code
+            return
+        if 0xDC00 <= code < 0xE000:
+            if not self.__highSurrogate:
+                return
+            code = 0x10000 + ((self.__highSurrogate - 0xD800) << 10) + (code - 0xDC00)
+        self.__highSurrogate = 0
+        if self.__capture:
+            for encoded in chr(code).encode("utf-8"):
+                self.__append(encoded)
+
+    def __text(self) -> str:
+        """Decodes the captured bytes, dropping a UTF-8 sequence cut off by truncation."""
+        length = self.__length
+        while length > 0:
+            try:
+                return str(self.__buffer[:length], "utf-8")
+            except UnicodeError:
+                length -= 1
+        return ""
+
+    def __literal(self):
+        text = self.__text()
+        if text == "true":
+            return True
+        if text == "false":
+            return False
+        if text == "null":
+            return None
+        if "." in text or "e" in text or "E" in text:
+            return float(text)
+        return int(text)
+
+    def __open(self, byte) -> None:
+        if not self.__matches(True):
+            self.__state = SKIP
+            self.__skipDepth = 1
+            return
+        self.__containers.append(byte)
+        if byte == OPEN_OBJECT:
+            self.__path.append("")
+            self.__state = KEY
+        else:
+            self.__path.append(0)
+            self.__state = VALUE
+            for wanted in self.__wildcards():
+                self.values.setdefault(wanted, [])
+
+    def __close(self) -> None:
+        self.__containers.pop()
+        self.__path.pop()
+        if self.__containers:
+            self.__state = AFTER
+        else:
+            self.__state = DONE
+            self.done = True
+
+    def feed(self, chunk) -> None:
+        """Parses the next chunk of the document (bytes, bytearray or memoryview)."""
+        i = 0
+        length = len(chunk)
+        while i < length:
+            byte = chunk[i]
+            state = self.__state
+            i += 1
+
+            if state == SKIP_STRING:
+                if byte == BACKSLASH:
+                    self.__state = SKIP_ESCAPE
+                elif byte == QUOTE:
+                    self.__state = SKIP
+            elif state == SKIP:
+                if byte == QUOTE:
+                    self.__state = SKIP_STRING
+                elif byte == OPEN_OBJECT or byte == OPEN_ARRAY:
+                    self.__skipDepth += 1
+                elif byte == CLOSE_OBJECT or byte == CLOSE_ARRAY:
+                    self.__skipDepth -= 1
+                    if self.__skipDepth == 0:
+                        self.__state = AFTER
+            elif state == SKIP_ESCAPE:
+                self.__state = SKIP_STRING
+            elif state == STRING:
+                if byte == QUOTE:
+                    if self.__isKey:
+                        self.__path[-1] = self.__text()
+                        self.__state = COLON
+                    else:
+                        if self.__capture:
+                            self.__store(self.__text())
+                        self.__state = AFTER
+                elif byte == BACKSLASH:
+                    self.__state = ESCAPE
+                else:
+                    self.__append(byte)
+            elif state == ESCAPE:
+                if byte == 117: # \uXXXX
+                    self.__unicode = 0
+                    self.__unicodeDigits = 0
+                    self.__state = UNICODE
+                else:
+                    self.__append(ESCAPES.get(byte, byte))
+                    self.__state = STRING
+            elif state == UNICODE:
+                self.__unicode = self.__unicode * 16 + int(chr(byte), 16)
+                self.__unicodeDigits += 1
+                if self.__unicodeDigits == 4:
+                    self.__state = STRING
+                    self.__appendCodepoint(self.__unicode)
+            elif byte in WHITESPACE:
+                if state == LITERAL:
+                    if self.__capture:
+                        self.__store(self.__literal())
+                    self.__state = AFTER
+            elif state == LITERAL:
+                if byte == COMMA or byte == CLOSE_OBJECT or byte == CLOSE_ARRAY:
+                    if self.__capture:
+                        self.__store(self.__literal())
+                    self.__state = AFTER
+                    i -= 1 # The delimiter is handled in the AFTER state
+                else:
+                    self.__append(byte)
+            elif state == AFTER:
+                if byte == COMMA:
+                    if self.__containers[-1] == OPEN_OBJECT:
+                        self.__state = KEY
+                    else:
+                        self.__pad()
+                        self.__path[-1] += 1
+                        self.__state = VALUE
+                else: # } or ]
+                    if self.__containers[-1] == OPEN_ARRAY:
+                        self.__pad()
+                    self.__close()
+            elif state == KEY:
+                if byte == QUOTE:
+                    self.__isKey = True
+                    self.__capture = True
+                    self.__length = 0
+                    self.__state = STRING
+                else: # Empty object
+                    self.__close()
+            elif state == COLON:
+                self.__state = VALUE
+            elif state == VALUE:
+                if byte == QUOTE:
+                    self.__isKey = False
+                    self.__capture = self.__matches(False)
+                    self.__length = 0
+                    self.__state = STRING
+                elif byte == OPEN_OBJECT or byte == OPEN_ARRAY:
+                    self.__open(byte)
+                elif byte == CLOSE_ARRAY: # Empty array
+                    self.__close()
+                else:
+                    self.__capture = self.__matches(False)
+                    self.__length = 0
+                    self.__append(byte)
+                    self.__state = LITERAL
+            else: # DONE, trailing bytes are ignored
+                return
+
+    def get(self, path, default=None):
+        """Returns the value extracted at path."""
+        return self.values.get(tuple(path), default)
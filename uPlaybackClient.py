@@ -0,0 +1,58 @@
+"""Reads the playback of one account from a PlaybackServer, for devices running MicroPython.\n
+No Spotify credentials are needed on the device, and unchanged playback costs a 304 response without a body."""
+import urequests as requests
+import ujson as json
+
+# Other Programs
+from TrackSnapshot import TrackSnapshot
+
+class uPlaybackClient:
+    def __init__(self, SERVER_URL, ACCOUNT) -> None:
+        """SERVER_URL - Address of the PlaybackServer, e.g. http://192.168.1.10:8080\n
+        ACCOUNT -> Name of the account to follow"""
+        self.SERVER_URL = SERVER_URL
+        self.ACCOUNT = ACCOUNT
+        self.url = f"{SERVER_URL}/playback/{ACCOUNT}"
+        self.etag = None
+        self.artETags = {} # Rendition: ETag of the art last received
+        self.snapshot = None # Last TrackSnapshot received, None when nothing is playing
+
+    def poll(self) -> tuple:
+        """Returns (snapshot, changed), snapshot being the current TrackSnapshot (None when nothing is playing)\n
+        and changed False if the playback is the same as on the previous poll. Raises OSError if the server cannot be reached."""
+        headers = {"If-None-Match": self.etag} if self.etag is not None else {}
+        response = requests.get(self.url, headers=headers)
+        try:
+            statusCode = response.status_code
+            if statusCode == 304:
+                return self.snapshot, False
+            if statusCode == 204:
+                self.snapshot = None
+            elif statusCode == 200:
+                data = json.loads(response.content)
+                if self.snapshot is None:
+                    self.snapshot = TrackSnapshot()
+                for key in TrackSnapshot.__slots__:
+                    setattr(self.snapshot, key, data.get(key))
+            else:
+                return self.snapshot, False
+            self.etag = response.headers.get("ETag")
+            return self.snapshot, True
+        finally:
+            response.close()
+
+    def art(self, RENDITION) -> tuple:
+        """Returns (data, changed): the art of the current track in a rendition configured on the server (e.g. "thumb", 64x64 RGB565),\n
+        ready to be written to the display. data is None when it is unchanged since the last call, or there is no art."""
+        headers = {"If-None-Match": self.artETags[RENDITION]} if RENDITION in self.artETags else {}
+        response = requests.get(f"{self.SERVER_URL}/art/{self.ACCOUNT}/{RENDITION}", headers=headers)
+        try:
+            if response.status_code == 304:
+                return None, False
+            if response.status_code != 200:
+                changed = self.artETags.pop(RENDITION, None) is not None
+                return None, changed
+            self.artETags[RENDITION] = response.headers.get("ETag")
+            return response.content, True
+        finally:
+            response.close()
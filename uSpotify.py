@@ -1,24 +1,38 @@
 """Spotify object for devices running MicroPython (designed for Pi Pico, but should work with other devices)."""
 import urequests as requests
 import ujson as json
-from udatetime import udatetime
+from udatetime import udatetime, ticks_ms, ticks_diff, ticks_add
 
 # Other Programs
-from URLEncoding import urlencoding
+from SpotifyCore import (
+    TOKEN_MARGIN, CONTEXT_PATH, authorizeUrl, tokenUrl, playbackUrl, searchUrl, addToQueueUrl, skipUrl, playlistItemsUrl, playlistImageUrl,
+    authorizationCodeForm, refreshTokenForm, tokenRequest, tokenResult, responseResult, contextUrl, needsPlaylistArt, setPlaylistArt
+)
+from TrackSnapshot import TrackSnapshot, extractSnapshot, snapshotFromValues, PLAYBACK_PATHS
         
 class uSpotify:
-    def __init__(self, BASE_64_STRING, CLIENT_ID, REDIRECT_URI, SCOPES, TIMEZONE) -> None:
+    TOKEN_MARGIN = TOKEN_MARGIN # Seconds before expiry at which the access token is refreshed
+    STREAM_CHUNK = 512 # Bytes read from the socket at a time when streaming a response
+
+    def __init__(self, BASE_64_STRING, CLIENT_ID, REDIRECT_URI, SCOPES, TIMEZONE, API_URL="https://api.spotify.com", ACCOUNTS_URL="https://accounts.spotify.com") -> None:
         """BASE_64_STRING - Base 64 String of --> clientid:clientsecret\n
         CLIENT_ID - Users client ID from --> https://developer.spotify.com/dashboard\n
         REDIRECT_URI - Found on Spotify Developer Dashboard\n
         SCOPES -> Required scopes for the application to function\n
-        TIMEZONE -> Current local timezone"""
+        TIMEZONE -> Current local timezone\n
+        API_URL, ACCOUNTS_URL -> Base URLs of the Spotify Web API and Accounts service"""
         self.BASE_64_STRING = BASE_64_STRING 
         self.CLIENT_ID = CLIENT_ID
         self.REDIRECT_URI = REDIRECT_URI
         self.SCOPES = SCOPES
-        self.localtime = udatetime(TIMEZONE)
+        self.API_URL = API_URL
+        self.ACCOUNTS_URL = ACCOUNTS_URL
+        self.localtime = udatetime(TIMEZONE) # Synced on first use, not needed for token expiry
         self.accessToken = ""
+        self.accessTokenDeadline = 0 # ticks_ms() value after which the access token is refreshed
+        self.__snapshot = TrackSnapshot() # Reused by every poll to avoid heap churn
+        self.__extractor = None # Created with its buffers on the first streamed request
+        self.__buffer = None
         data = self.__retrieveCredFile()
         try:
             self.refreshToken = data["REFRESHKEY"]
@@ -40,90 +54,102 @@ class uSpotify:
     def getKeyUrl(self) -> str:
         """Returns the URL to access the refresh token\n
         Code is stated after ?code="""
-        return f"https://accounts.spotify.com/authorize?client_id={self.CLIENT_ID}&scope={self.SCOPES}&response_type=code&redirect_uri={self.REDIRECT_URI}"
+        return authorizeUrl(self.ACCOUNTS_URL, self.CLIENT_ID, self.SCOPES, self.REDIRECT_URI)
+
+    def __tokenRequest(self, form) -> dict:
+        """Posts a form to the token endpoint, authenticating with the client secret."""
+        headers, body = tokenRequest(form, self.BASE_64_STRING)
+        response = requests.post(url=tokenUrl(self.ACCOUNTS_URL), headers=headers, data=body)
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+        finally:
+            response.close()
 
     def __getAuthorizationTokens(self, token) -> None:
         """Gets initial refresh and access token, using the intial authorization token."""
-        authHeader = {}
-        authHeader["Authorization"] = "Basic " + self.BASE_64_STRING
-
-        url = "https://accounts.spotify.com/api/token"
-        form = {
-            "code":token,
-            "redirect_uri":self.REDIRECT_URI,
-            "grant_type":"authorization_code"
-        }
-        headers = {
-            "Authorization":"Basic " + self.BASE_64_STRING,
-            "Content-Type":"application/x-www-form-urlencoded"
-        }
-        form = urlencoding.urlencode(form) # type: ignore
-
-        # Get Spotify Response
-        response = requests.post(url=url, headers=headers, data=form).json()
-        
-        try:
-            self.refreshToken = response["refresh_token"]
-            self.accessToken = response["access_token"]
-            self.accessTokenExpiry = [self.localtime.now(), int(response["expires_in"])]
-        except KeyError:
+        response = self.__tokenRequest(authorizationCodeForm(token, self.REDIRECT_URI))
+        accessToken, expiresIn, refreshToken = tokenResult(response)
+        if accessToken is None or refreshToken is None:
             print(response)
+            return
+        self.refreshToken = refreshToken
+        self.__setAccessToken(accessToken, expiresIn)
 
     def __refreshAccessToken(self) -> None:
         """Refreshes the Access token using the Refresh Token when it expires."""
-        url = "https://accounts.spotify.com/api/token"
-        form = {
-            "grant_type": "refresh_token",
-            "refresh_token":self.refreshToken
-        }
-        headers = {
-            "Authorization":"Basic " + self.BASE_64_STRING,
-            "Content-Type":"application/x-www-form-urlencoded"
-        }
-
-        # Get Spotify response
-        response = requests.post(url=url, headers=headers, data=urlencoding.urlencode(query=form)).json() # type: ignore
-        
-        try:
-            self.accessToken = response["access_token"]
-            self.accessTokenExpiry = [self.localtime.now(), int(response["expires_in"])]
-        except KeyError:
+        accessToken, expiresIn, refreshToken = tokenResult(self.__tokenRequest(refreshTokenForm(self.refreshToken)))
+        if accessToken is not None:
+            self.__setAccessToken(accessToken, expiresIn)
+        else:
             print("InvalidRefreshToken", self.refreshToken)
-            
-        try: # As the API doesn't always respond with a refresh token, incase it does, it will be recorded.
-            self.refreshToken = response["refresh_token"]
-        except KeyError:
-            pass
+        if refreshToken is not None: # As the API doesn't always respond with a refresh token, incase it does, it will be recorded.
+            self.refreshToken = refreshToken
     
-    def get(self, url) -> dict:
-        """Handles token expiry and no content automatically when making an HTTP GET request."""
-        headers = {"Authorization": f"Bearer {self.accessToken}"}
-        response = requests.get(url, headers=headers)
+    def __setAccessToken(self, accessToken, expiresIn) -> None:
+        """Stores the access token and the local monotonic deadline at which it must be refreshed."""
+        self.accessToken = accessToken
+        self.accessTokenDeadline = ticks_add(ticks_ms(), (int(expiresIn) - self.TOKEN_MARGIN) * 1000)
+
+    def __tokenExpired(self) -> bool:
+        return self.accessToken == "" or ticks_diff(self.accessTokenDeadline, ticks_ms()) <= 0
+
+    def __send(self, method, url, data="", stream=False):
+        """Sends an HTTP request and returns the response, refreshing the access token before it expires.\n
+        If the API still responds 401 the token is refreshed and the original request is retried once.\n
+        stream -> Leave the body unread on the socket, for getStreamed"""
+        if self.__tokenExpired():
+            self.__refreshAccessToken()
+        response = requests.request(method, url, data=data, headers={"Authorization": f"Bearer {self.accessToken}"}, stream=stream)
         if response.status_code == 401:
             print("Token Expired")
+            response.close()
             self.__refreshAccessToken()
-            return self.requestPlayback(), response.status_code
-        elif response.status_code == 204:
-            return json.dumps({"Playback":"No Content"}), response.status_code
-        elif response.status_code == 200:
-            return response.json(), response.status_code
+            response = requests.request(method, url, data=data, headers={"Authorization": f"Bearer {self.accessToken}"}, stream=stream)
+        return response
+
+    def __response(self, response) -> dict:
+        """Reads a response into (data, statusCode), see SpotifyCore.responseResult."""
+        statusCode = response.status_code
+        if statusCode == 204:
+            response.close()
+            return responseResult(statusCode, None)
+        return responseResult(statusCode, response.content)
+
+    def __request(self, method, url, data="") -> dict:
+        return self.__response(self.__send(method, url, data))
+
+    def get(self, url) -> dict:
+        """Handles token expiry and no content automatically when making an HTTP GET request."""
+        return self.__request("GET", url)
+
+    def getStreamed(self, url, extractor) -> dict:
+        """Makes an HTTP GET request whose body is parsed while it is read from the socket, STREAM_CHUNK bytes at a time\n
+        into a preallocated buffer, keeping only the values at the extractor's paths. Returns (extractor.values, statusCode)."""
+        response = self.__send("GET", url, stream=True)
+        if response.status_code != 200:
+            return self.__response(response)
+        if self.__buffer is None:
+            self.__buffer = bytearray(self.STREAM_CHUNK)
+        view = memoryview(self.__buffer)
+        extractor.reset()
+        while not extractor.done:
+            count = response.raw.readinto(self.__buffer)
+            if not count:
+                break
+            extractor.feed(view[:count])
+        response.close()
+        return extractor.values, response.status_code
         
     def post(self, url, data="") -> dict:
         """Handles token expiry and no content automatically when making an HTTP POST request."""
-        headers = {"Authorization": f"Bearer {self.accessToken}"}
-        response = requests.post(url, headers=headers, data=data)
-        if response.status_code == 401:
-            print("Token Expired")
-            self.__refreshAccessToken()
-            return self.requestPlayback(), response.status_code
-        elif response.status_code == 204:
-            return json.dumps({"Playback":"No Content"}), response.status_code
-        elif response.status_code == 200:
-            return response.json(), response.status_code
+        return self.__request("POST", url, data)
     
-    def requestPlayback(self) -> json:
-        """Returns the users currently playing song as a json object."""
-        return self.get('https://api.spotify.com/v1/me/player')
+    def requestPlayback(self, market=None) -> json:
+        """Returns the users currently playing song as a json object.\n
+        market -> e.g. "from_token", the API then leaves out the available_markets lists, shrinking the response"""
+        return self.get(playbackUrl(self.API_URL, market))
 
     def __retrieveCredFile(self) -> dict:
         """Retrieves refresh token from Credentials file."""
@@ -136,61 +162,42 @@ class uSpotify:
         with open(f"credentials.json", "w") as f:
             json.dump(data, f)
 
-    def requestFormattedPlayback(self) -> dict:
-        """Retrieves the users currently playing song, formats it into the necessary data and outputs it as a dictionary."""
-        data, statusCode = self.requestPlayback()
+    def requestPlaybackSnapshot(self, stream=False, market=None) -> TrackSnapshot:
+        """Retrieves the users currently playing song as a TrackSnapshot, falling back to the playlist image when the track has no album art.\n
+        The same snapshot object is updated on every call, copy it with asDict() to keep an older value.\n
+        stream -> Extract the snapshot while the response is read instead of parsing it whole, bounding the heap used per poll\n
+        market -> e.g. "from_token", shrinks the response, see requestPlayback"""
+        if stream:
+            if self.__extractor is None:
+                from uJSONStream import JSONExtractor # Only loaded onto the heap by devices which stream
+                self.__extractor = JSONExtractor(PLAYBACK_PATHS + (CONTEXT_PATH,))
+            values, statusCode = self.getStreamed(playbackUrl(self.API_URL, market), self.__extractor)
+            if statusCode != 200:
+                return values, statusCode
+            snapshot = snapshotFromValues(values, self.__snapshot)
+            playlist = needsPlaylistArt(snapshot, values.get(CONTEXT_PATH))
+            if playlist is not None:
+                setPlaylistArt(snapshot, self.getPlaylistImage(playlist)[0])
+            return snapshot, statusCode
+
+        data, statusCode = self.requestPlayback(market)
         
         # If there is no content, there is nothing to format!
         if statusCode == 204:
             return data, statusCode
         
-        try:
-            trackID = data['item']['id']
-        except KeyError:
-            trackID = None
-        try:
-            trackName = data['item']['name']
-        except KeyError:
-            trackName = None
-        try:
-            names = []
-            for i in range(0, len(data['item']['artists'])):
-                names.append(data['item']['artists'][i]["name"])
-            trackArtists = ", ".join(names)
-        except KeyError:
-            trackArtists = None
-        try:
-            link = data['item']['external_urls']['spotify']
-        except:
-            link = None
-        try:
-            try:
-                lqAlbumArt = data["item"]["album"]["images"][2]["url"]
-            except KeyError:
-                lqAlbumArt = None
-            try:
-                hqAlbumArt = data["item"]["album"]["images"][0]["url"]
-            except KeyError:
-                hqAlbumArt = None
-        except IndexError:
-            lqAlbumArt = None
-            hqAlbumArt = None
-        try:
-            playing = data["is_playing"]
-        except KeyError:
-            playing = False
-
-        trackData = {
-            "id":trackID,
-            "name":trackName,
-            "artists":trackArtists,
-            "link":link,
-            "hq_art":hqAlbumArt,
-            "art":lqAlbumArt,
-            "playing":playing
-        }
+        snapshot = extractSnapshot(data, self.__snapshot)
+        playlist = needsPlaylistArt(snapshot, contextUrl(data))
+        if playlist is not None:
+            setPlaylistArt(snapshot, self.getPlaylistImage(playlist)[0])
+        return snapshot, statusCode
 
-        return trackData, statusCode
+    def requestFormattedPlayback(self, stream=False, market=None) -> dict:
+        """Retrieves the users currently playing song, formats it into the necessary data and outputs it as a dictionary."""
+        snapshot, statusCode = self.requestPlaybackSnapshot(stream, market)
+        if statusCode == 204:
+            return snapshot, statusCode
+        return snapshot.asDict(), statusCode
 
     def search(self, query, searchType) -> dict:
         """Searches for a song on the Spoify Database\n
@@ -198,38 +205,27 @@ class uSpotify:
         * "track"
         * "album"
         * "artist" """
-        url = "https://api.spotify.com/v1/search"
-        searchQuery = f"?q={query}&type={searchType}"
-        return self.get(f"{url}{searchQuery}")
+        return self.get(searchUrl(self.API_URL, query, searchType))
     
     def searchAndQueue(self, query) -> json:
         """Searches and Queues a song on the users spotify account."""
-        response = self.search(query, "track")
+        response, statusCode = self.search(query, "track")
         newTrack = response["tracks"]["items"][0]["uri"]
         return self.addToQueue(newTrack)
     
     def addToQueue(self, uri) -> json:
         """Adds a track to queue, using the tracks unique identifier."""
-        url = "https://api.spotify.com/v1/me/player/queue"
-        track = f"?uri={uri}"
-        return self.post(f"{url}{track}")
+        return self.post(addToQueueUrl(self.API_URL, uri))
     
     def skip(self, forward=True) -> json:
         """Skips the currently playing song in the users queue."""
-        url_fw = "https://api.spotify.com/v1/me/player/next"
-        url_bw = "https://api.spotify.com/v1/me/player/previous"
-        if forward:
-            return self.post(url_fw)
-        else:
-            return self.post(url_bw)
+        return self.post(skipUrl(self.API_URL, forward))
     
     def getPlaylistItems(self, playlistID) -> dict:
         """Gets the whole contents of a users playlist."""
-        url = f"https://api.spotify.com/v1/playlists/{playlistID}/tracks"
-        return self.get(url)
+        return self.get(playlistItemsUrl(self.API_URL, playlistID))
 
     def getPlaylistImage(self, playlistID) -> str:
         """Gets the image of the currently playing playlist"""
-        url = f"https://api.spotify.com/v1/playlists/{playlistID}/images"
-        return self.get(url)
+        return self.get(playlistImageUrl(self.API_URL, playlistID))
 
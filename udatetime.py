@@ -1,22 +1,99 @@
+"""Local clock for MicroPython. The time is fetched once, then served from the RTC with periodic resyncs to correct drift."""
+import time
 import urequests as requests
 
+try:
+    from time import ticks_ms, ticks_diff, ticks_add
+except ImportError: # CPython, e.g. when replaying payloads in the benchmarks
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(new, old):
+        return new - old
+
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+def civilFromDays(days) -> tuple:
+    """Returns (year, month, day) for a number of days since 1970-01-01, independent of the ports time epoch."""
+    days += 719468
+    era = days // 146097
+    dayOfEra = days - era * 146097
+    yearOfEra = (dayOfEra - dayOfEra // 1460 + dayOfEra // 36524 - dayOfEra // 146096) // 365
+    dayOfYear = dayOfEra - (365 * yearOfEra + yearOfEra // 4 - yearOfEra // 100)
+    monthIndex = (5 * dayOfYear + 2) // 153
+    day = dayOfYear - (153 * monthIndex + 2) // 5 + 1
+    month = monthIndex + 3 if monthIndex < 10 else monthIndex - 9
+    return yearOfEra + era * 400 + (month <= 2), month, day
+
 class udatetime:
-    def __init__(self, timezone):
+    def __init__(self, timezone, resyncInterval=21600, useNTP=True):
+        """timezone -> e.g. Europe/London, used once to fetch the UTC offset\n
+        resyncInterval -> Seconds between resyncs correcting RTC drift\n
+        useNTP -> Resync over NTP (a single UDP packet) when ntptime is available, instead of HTTP"""
         self.url = f"http://worldtimeapi.org/api/timezone/{timezone}"
-    
+        self.resyncInterval = resyncInterval
+        self.useNTP = useNTP
+        self.utcOffset = 0 # Seconds added to UTC for local time
+        self.__rtcOffset = None # Seconds added to time.time() for Unix time
+        self.__syncedAt = 0
+
+    def sync(self) -> None:
+        """Fetches the time and UTC offset from worldtimeapi."""
+        response = requests.get(self.url)
+        data = response.json()
+        response.close()
+        self.utcOffset = int(data.get("raw_offset", 0)) + int(data.get("dst_offset", 0))
+        self.__setUnixtime(data["unixtime"])
+
+    def __syncNTP(self) -> bool:
+        """Corrects the clock over NTP, keeping the current UTC offset. Returns False if NTP is unavailable."""
+        try:
+            import ntptime
+            seconds = ntptime.time()
+        except Exception:
+            return False
+        if time.gmtime(0)[0] == 2000: # Ports using the 2000 epoch
+            seconds += 946684800
+        self.__setUnixtime(seconds)
+        return True
+
+    def __setUnixtime(self, unixtime) -> None:
+        self.__rtcOffset = unixtime - time.time()
+        self.__syncedAt = ticks_ms()
+
+    def unixtime(self) -> int:
+        """Seconds since 1970-01-01 UTC, syncing only on first use and once every resyncInterval."""
+        if self.__rtcOffset is None:
+            self.sync()
+        elif ticks_diff(ticks_ms(), self.__syncedAt) > self.resyncInterval * 1000:
+            if not (self.useNTP and self.__syncNTP()):
+                self.sync()
+        return int(time.time() + self.__rtcOffset)
+
+    def __local(self) -> tuple:
+        """Returns the local date and time as ("YYYY-MM-DD", "HH:MM:SS")."""
+        seconds = self.unixtime() + self.utcOffset
+        year, month, day = civilFromDays(seconds // 86400)
+        seconds %= 86400
+        return "%04d-%02d-%02d" % (year, month, day), "%02d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
     def now(self) -> str:
-        datetime = requests.get(self.url).json()["datetime"]
-        return str(datetime[:10]) + " " + str(datetime[11:19])
-    
+        date, clock = self.__local()
+        return date + " " + clock
+
     def getDate(self):
-        return requests.get(self.url).json()["datetime"][:10]
-    
+        return self.__local()[0]
+
     def getTime(self):
-        return requests.get(self.url).json()["datetime"][11:19]
-    
+        return self.__local()[1]
+
     def getDatetime(self):
-        return requests.get(self.url).json()["datetime"]
-    
+        date, clock = self.__local()
+        sign = "-" if self.utcOffset < 0 else "+"
+        offset = abs(self.utcOffset)
+        return "%sT%s.000000%s%02d:%02d" % (date, clock, sign, offset // 3600, offset // 60 % 60)
+
 if __name__ == "__main__":
     localtime = udatetime("Europe/London")
     print(localtime.now())